@@ -0,0 +1,500 @@
+"""
+Shared MySQL connection pool.
+
+Every module asks get_pool() for a connection instead of calling
+mysql.connector.connect() itself. Connections are wrapped so that
+calling close() returns them to the pool, which keeps the existing
+`connection.close()` clean-up code working unchanged.
+connection.statement_cursor() reuses prepared statements cached per
+connection; the hit ratio is in get_pool().stats().
+
+There is one copy of this file, at the repository root. Each exercise
+directory has a db_pool.py symlink to it, so scripts run from their
+own directory still import it.
+
+Connection settings come from the environment:
+    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+# Prepared statements kept per connection (0 disables the cache)
+DEFAULT_STATEMENT_CACHE_SIZE = 32
+
+# ER_UNSUPPORTED_PS: the statement cannot be prepared server-side
+ER_UNSUPPORTED_PS = 1295
+
+
+class StatementCache:
+    """
+    LRU of server-side prepared statements for one connection, keyed
+    by query text and row format. Each entry is a prepared cursor that
+    has already sent PREPARE, so running the same query again sends
+    only its parameters and the server skips parsing. A statement is
+    only added once it has executed successfully. The least recently
+    used one is then evicted once `capacity` are held; it is
+    deallocated before the next lookup, when no result is pending.
+    Queries the server refuses to prepare are remembered (up to
+    `capacity` of them) so they go straight to a plain cursor.
+    """
+    def __init__(self, pool, connection, capacity):
+        self._pool = pool
+        self._connection = connection
+        self.capacity = capacity
+        self._entries = OrderedDict()       # (query, dictionary) -> (query, cursor)
+        self._unpreparable = OrderedDict()  # (query, dictionary) -> None, LRU first
+        self._retired = []                  # evicted cursors still to deallocate
+
+    def lookup(self, query, dictionary=False):
+        """
+        Returns (query, prepared cursor, hit), or None if the query
+        cannot be prepared. On a miss the cursor is new and not cached
+        yet: call store() once it has executed. Execute the returned
+        query object, not an equal copy: mysql.connector re-prepares
+        unless it is the same object.
+        """
+        if self._retired:
+            self._retired = [cursor for cursor in self._retired if not self._close_cursor(cursor)]
+        key = (query, dictionary)
+        if key in self._unpreparable:
+            self._unpreparable.move_to_end(key)
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._pool._count('statement_hits')
+            return entry + (True,)
+
+        self._pool._count('statement_misses')
+        return query, self._connection.cursor(prepared=True, dictionary=dictionary), False
+
+    def store(self, query, dictionary, cursor):
+        """Caches a cursor whose statement prepared and executed successfully."""
+        self._entries[(query, dictionary)] = (query, cursor)
+        if len(self._entries) > self.capacity:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._pool._count('statement_evictions')
+            self._retired.append(evicted)
+
+    def reject(self, query, dictionary, cursor, unpreparable=False):
+        """Drops a new cursor whose statement failed, remembering unpreparable ones."""
+        self._close_cursor(cursor)
+        if unpreparable:
+            self._unpreparable[(query, dictionary)] = None
+            if len(self._unpreparable) > self.capacity:
+                self._unpreparable.popitem(last=False)
+
+    @staticmethod
+    def _close_cursor(cursor):
+        """Closes a cursor; False if it could not be closed yet."""
+        try:
+            cursor.close()
+            return True
+        except Error:
+            return False
+
+
+class StatementCursor:
+    """
+    Cursor that runs each query through its connection's
+    StatementCache. Queries with dict parameters, extra execute()
+    arguments (multi=, map_results=...) or that the server cannot
+    prepare go through an ordinary cursor instead, as do callproc()
+    and executemany(). Other attributes (rowcount, description,
+    fetch*) come from whichever cursor ran the last query, or from the
+    ordinary cursor before any has run.
+    """
+    def __init__(self, statements, connection, dictionary=False):
+        self._statements = statements
+        self._connection = connection
+        self._dictionary = dictionary
+        self._plain = None
+        self._cursor = None
+
+    def _current(self):
+        return self._cursor if self._cursor is not None else self._plain_cursor()
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
+    def __iter__(self):
+        return iter(self._current())
+
+    def _plain_cursor(self):
+        if self._plain is None:
+            self._plain = self._connection.cursor(dictionary=self._dictionary)
+        return self._plain
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        entry = None
+        if not (args or kwargs or isinstance(params, dict)):
+            entry = self._statements.lookup(operation, self._dictionary)
+        if entry is not None:
+            query, cursor, hit = entry
+            self._cursor = cursor
+            try:
+                result = cursor.execute(query, params)
+            except Error as e:
+                if hit:
+                    raise
+                # PREPARE may have failed: never cache the new statement
+                unsupported = e.errno == ER_UNSUPPORTED_PS
+                self._statements.reject(operation, self._dictionary, cursor, unpreparable=unsupported)
+                if not unsupported:
+                    raise
+            else:
+                if not hit:
+                    self._statements.store(query, self._dictionary, cursor)
+                return result
+        self._cursor = self._plain_cursor()
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        # The plain cursor folds an INSERT batch into one multi-row
+        # statement, which beats one prepared round trip per row
+        self._cursor = self._plain_cursor()
+        return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        self._cursor = self._plain_cursor()
+        return self._cursor.callproc(procname, *args, **kwargs)
+
+    def close(self):
+        """Closes the fallback cursor; cached statements stay prepared."""
+        if self._plain is not None:
+            self._plain.close()
+            self._plain = None
+        self._cursor = None
+
+
+class PooledConnection:
+    """
+    Proxy around a leased connection. Attribute access goes to the
+    real connection; close() hands it back to the pool instead.
+    """
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def statement_cursor(self, dictionary=False):
+        """
+        Cursor that reuses this connection's cached prepared statements
+        (see StatementCache), or a plain cursor if the cache is off.
+        """
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        statements = self._pool.statements_for(self._connection)
+        if statements is None:
+            return self._connection.cursor(dictionary=dictionary)
+        return StatementCursor(statements, self._connection, dictionary)
+
+    def reset_session(self, *args, **kwargs):
+        """Resets the server session, which deallocates its prepared statements."""
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        self._pool.drop_statements(self._connection)
+        return self._connection.reset_session(*args, **kwargs)
+
+    def discard(self):
+        """Closes the underlying connection instead of pooling it."""
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections.
+
+    - min_size: idle connections kept even when they pass idle_timeout
+    - max_size: connections open at once; acquire() waits beyond that
+    - idle_timeout: seconds before a spare idle connection is closed
+    - ping_after: connections idle longer than this are pinged on
+      checkout and replaced if the server has dropped them
+    - statement_cache_size: prepared statements cached per connection
+      for statement_cursor() (0 disables the cache)
+    """
+    def __init__(self, min_size=1, max_size=10, idle_timeout=300.0,
+                 ping_after=5.0, statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE,
+                 **connect_args):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.statement_cache_size = statement_cache_size
+        self.connect_args = connect_args
+
+        self._idle = []  # (connection, returned_at), most recent last
+        self._size = 0
+        self._statements = {}  # id(connection) -> StatementCache
+        self._lock = threading.Condition()
+        self._closed = False
+        self.metrics = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'evicted_idle': 0,
+            'statement_hits': 0,
+            'statement_misses': 0,
+            'statement_evictions': 0,
+        }
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self.connect_args)
+        with self._lock:
+            self.metrics['created'] += 1
+        return connection
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def statements_for(self, connection):
+        """The StatementCache of a raw connection, or None if caching is off."""
+        if not self.statement_cache_size:
+            return None
+        with self._lock:
+            statements = self._statements.get(id(connection))
+            if statements is None:
+                statements = self._statements[id(connection)] = StatementCache(
+                    self, connection, self.statement_cache_size
+                )
+            return statements
+
+    def drop_statements(self, connection):
+        """Forgets a connection's statements once the server has freed them."""
+        with self._lock:
+            self._statements.pop(id(connection), None)
+
+    def _close(self, connection):
+        self.drop_statements(connection)
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self.metrics['closed'] += 1
+            self._lock.notify()
+
+    def _evict_idle(self, now):
+        """Pops spare connections idle past idle_timeout. Caller holds the lock."""
+        expired = []
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.pop(0)[0])
+            self.metrics['evicted_idle'] += 1
+        return expired
+
+    def warm(self):
+        """Opens connections until min_size are idle."""
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._connect()
+            except Error:
+                with self._lock:
+                    self._size -= 1
+                raise
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+
+    def acquire(self, timeout=None):
+        """
+        Leases a connection, waiting up to `timeout` seconds (forever
+        when None) if max_size connections are already out. Raises
+        PoolError on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited_since = None
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    action = 'reuse'
+                elif self._size < self.max_size:
+                    self._size += 1
+                    connection, returned_at = None, now
+                    action = 'create'
+                else:
+                    if waited_since is None:
+                        waited_since = now
+                        self.metrics['waits'] += 1
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        self.metrics['timeouts'] += 1
+                        self.metrics['wait_seconds'] += now - waited_since
+                        raise PoolError(f"No connection available within {timeout}s")
+                    action = 'wait'
+            for stale in expired:
+                self._close(stale)
+
+            if action == 'wait':
+                with self._lock:
+                    if not self._idle and self._size >= self.max_size:
+                        self._lock.wait(remaining)
+                continue
+
+            if action == 'create':
+                try:
+                    connection = self._connect()
+                except Error:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif now - returned_at > self.ping_after and not connection.is_connected():
+                with self._lock:
+                    self.metrics['health_check_failures'] += 1
+                self._close(connection)
+                continue
+
+            with self._lock:
+                self.metrics['checkouts'] += 1
+                if waited_since is not None:
+                    self.metrics['wait_seconds'] += time.monotonic() - waited_since
+            return PooledConnection(self, connection)
+
+    def release(self, connection, discard=False):
+        """
+        Returns a raw connection to the pool. Uncommitted work is rolled
+        back; connections with unread results, or that fail to reset,
+        are closed instead of being reused.
+        """
+        if not discard:
+            try:
+                if getattr(connection, 'unread_result', False):
+                    discard = True
+                elif connection.in_transaction:
+                    connection.rollback()
+            except Error:
+                discard = True
+
+        with self._lock:
+            if not discard and not self._closed:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+                return
+        self._close(connection)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """`with pool.connection() as conn:` leases and returns a connection."""
+        leased = self.acquire(timeout)
+        try:
+            yield leased
+        finally:
+            leased.close()
+
+    def stats(self):
+        """Snapshot of pool sizes and counters."""
+        with self._lock:
+            lookups = self.metrics['statement_hits'] + self.metrics['statement_misses']
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self.metrics,
+                'statement_hit_ratio': self.metrics['statement_hits'] / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """Closes idle connections; leased ones are closed on release."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+
+_pools = {}  # connection settings -> ConnectionPool
+_pools_pid = None
+_pool_lock = threading.Lock()
+
+
+def connect_args_from_env():
+    """mysql.connector.connect() arguments for the ALX_prodev database."""
+    return {
+        'host': os.environ.get('MYSQL_HOST', 'localhost'),
+        'user': os.environ.get('MYSQL_USER', 'alx'),
+        'password': os.environ.get('MYSQL_PASSWORD', 'password'),
+        'database': os.environ.get('MYSQL_DATABASE', 'ALX_prodev'),
+    }
+
+
+def pool_settings_from_env():
+    """ConnectionPool sizing arguments from the DB_POOL_* / DB_STATEMENT_* variables."""
+    return {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'idle_timeout': float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+        'statement_cache_size': int(os.environ.get('DB_STATEMENT_CACHE_SIZE',
+                                                   DEFAULT_STATEMENT_CACHE_SIZE)),
+    }
+
+
+def get_pool(**connect_args):
+    """
+    Returns the process-wide pool for `connect_args` (by default the
+    MYSQL_* environment settings), creating it on first use, so every
+    caller using the same settings shares one pool. A forked child
+    gets fresh pools rather than sharing its parent's sockets.
+    """
+    global _pools, _pools_pid
+    key = tuple(sorted(connect_args.items())) if connect_args else None
+    with _pool_lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                **pool_settings_from_env(),
+                **(connect_args or connect_args_from_env())
+            )
+        return pool
+
+
+def get_connection(timeout=None):
+    """Leases a connection from the shared pool (close() returns it)."""
+    return get_pool().acquire(timeout)
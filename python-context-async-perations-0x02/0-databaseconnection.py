@@ -1,43 +1,74 @@
-import mysql.connector
+import asyncio
 from mysql.connector import Error
+from db_pool import connect_args_from_env, get_pool
+
 
 class DatabaseConnection:
     """
-    Custom context manager that handles opening and closing
-    a MySQL database connection automatically.
+    Custom context manager that leases a MySQL database connection
+    from a pool on entry and returns it on exit, so a loop of short
+    `with` blocks pays for one connect instead of one per block.
+
+    Before a connection goes back to the pool its session is reset
+    (uncommitted work, user variables and temporary tables are
+    dropped), so one block never sees another block's state.
+    Use `with` in synchronous code or `async with` in coroutines;
+    the async form leases and resets in a worker thread.
     """
-    def __init__(self, host, user, password, database):
+    def __init__(self, host, user, password, database, timeout=None):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
+        self.timeout = timeout
         self.connection = None
         self.cursor = None
 
     def __enter__(self):
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
+            # One shared pool per set of connection settings
+            pool = get_pool(host=self.host, user=self.user,
+                            password=self.password, database=self.database)
+            self.connection = pool.acquire(self.timeout)
             self.cursor = self.connection.cursor(dictionary=True)
-            print("✅ Database connection opened.")
+            print("✅ Database connection leased from pool.")
             return self.cursor
         except Error as e:
             print("❌ Error while connecting to database:", e)
             return None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.cursor:
-            self.cursor.close()
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("🔒 Database connection closed.")
+        connection, self.connection = self.connection, None
+        cursor, self.cursor = self.cursor, None
+        if connection:
+            self._release(connection, cursor)
+            print("🔒 Database connection returned to pool.")
         # Return False to re-raise any exception that occurs inside the with block
         return False
 
-with DatabaseConnection(...) as cursor:
-    cursor.execute("SELECT * FROM users")
-    print(cursor.fetchall())
\ No newline at end of file
+    @staticmethod
+    def _release(connection, cursor):
+        """Resets the session and returns the connection, or discards it."""
+        try:
+            if cursor:
+                cursor.close()
+            if connection.unread_result:
+                connection.discard()
+                return
+            connection.reset_session()
+        except Error:
+            connection.discard()
+            return
+        connection.close()
+
+    async def __aenter__(self):
+        return await asyncio.to_thread(self.__enter__)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await asyncio.to_thread(self.__exit__, exc_type, exc_val, exc_tb)
+
+
+if __name__ == "__main__":
+    with DatabaseConnection(**connect_args_from_env()) as cursor:
+        cursor.execute("SELECT * FROM users")
+        print(cursor.fetchall())
@@ -1,28 +1,47 @@
-import mysql.connector
 from mysql.connector import Error
+from db_pool import get_connection
+
+# Number of rows pulled from the server per round trip when streaming
+DEFAULT_CHUNK_SIZE = 1000
+
+# What __enter__ returns: the full list (the original behaviour),
+# a lazy iterator of rows, or a lazy iterator of row lists
+STREAM_MODES = (None, 'rows', 'chunks')
+
 
 class ExecuteQuery:
     """
     A reusable context manager that connects to the database,
     executes a given SQL query with parameters, and returns the results.
+
+    - stream: None returns every row as a list. 'rows' returns a lazy
+      iterator of rows and 'chunks' a lazy iterator of lists of up to
+      `chunk_size` rows. Both read rows from the server as they are
+      fetched, so client memory is bounded by chunk_size, not by the
+      result size.
+    - chunk_size: rows fetched per round trip when streaming
+
+    Streams must be consumed inside the `with` block; the connection
+    stays open until __exit__. Queries run as server-side prepared
+    statements cached on the pooled connection, so repeating a query
+    skips parsing it.
     """
-    def __init__(self, query, params=None):
+    def __init__(self, query, params=None, stream=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if stream not in STREAM_MODES:
+            raise ValueError(f"stream must be one of {STREAM_MODES}, not {stream!r}")
         self.query = query
         self.params = params
+        self.stream = stream
+        self.chunk_size = chunk_size
         self.connection = None
         self.cursor = None
         self.results = None
 
     def __enter__(self):
         try:
-            # Establish DB connection
-            self.connection = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='your_password',  # <-- replace with your MySQL password
-                database='ALX_prodev'
-            )
-            self.cursor = self.connection.cursor(dictionary=True)
+            # Lease a DB connection from the shared pool
+            self.connection = get_connection()
+            self.cursor = self.connection.statement_cursor(dictionary=True)
 
             print("✅ Connected to database.")
 
@@ -32,20 +51,52 @@ class ExecuteQuery:
             else:
                 self.cursor.execute(self.query)
 
-            # Fetch results
-            self.results = self.cursor.fetchall()
+            if self.stream == 'rows':
+                self.results = self._iter_rows()
+            elif self.stream == 'chunks':
+                self.results = self._iter_chunks()
+            else:
+                # Fetch results
+                self.results = self.cursor.fetchall()
             return self.results
 
         except Error as e:
             print("❌ Error while executing query:", e)
             return None
 
+    def _iter_chunks(self):
+        while self.cursor is not None:
+            rows = self.cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    def _iter_rows(self):
+        for rows in self._iter_chunks():
+            yield from rows
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         # Always clean up
-        if self.cursor:
-            self.cursor.close()
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("🔒 Database connection closed.")
+        try:
+            if self.cursor:
+                # A stream left unfinished leaves unread rows, and a plain
+                # cursor refuses to close over them: the pool discards
+                # that connection on return
+                try:
+                    self.cursor.close()
+                except Error:
+                    pass
+                self.cursor = None
+        finally:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+                print("🔒 Database connection returned to pool.")
         # Returning False means exceptions (if any) are not suppressed
         return False
+
+
+if __name__ == "__main__":
+    with ExecuteQuery("SELECT * FROM users WHERE age > %s", (25,), stream='chunks') as chunks:
+        for chunk in chunks:
+            print(f"{len(chunk)} users")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the context manager tasks.
+
+Usage:
+    python3 benchmarks.py database_connection 1000
+    python3 benchmarks.py statement_cache 10000
+"""
+import contextlib
+import io
+import sys
+import time
+
+import mysql.connector
+
+from db_pool import ConnectionPool, connect_args_from_env
+
+DatabaseConnection = __import__('0-databaseconnection').DatabaseConnection
+
+
+@contextlib.contextmanager
+def connect_per_block(host, user, password, database):
+    """The original DatabaseConnection: one new connection per block."""
+    connection = mysql.connector.connect(host=host, user=user, password=password, database=database)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def bench_database_connection(blocks=1000):
+    """
+    Time `blocks` short `with` blocks running SELECT 1 with
+    connect-per-block and with pooled leasing plus session reset.
+    """
+    variants = {
+        'connect-per-block': connect_per_block,
+        'pooled': DatabaseConnection,
+    }
+    settings = connect_args_from_env()
+
+    print(f"{'variant':>18} {'blocks':>8} {'seconds':>10} {'us/block':>10}")
+    for name, manager in variants.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(blocks):
+                with manager(**settings) as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+            elapsed = time.perf_counter() - start
+        print(f"{name:>18} {blocks:>8} {elapsed:>10.2f} {elapsed * 1e6 / blocks:>10.1f}")
+
+
+def bench_statement_cache(calls=10000):
+    """
+    Time `calls` repeated parameterised lookups on one pooled
+    connection with plain cursors and with cached prepared statements.
+    """
+    query = "SELECT * FROM users WHERE age > %s LIMIT 1"
+    variants = {
+        'plain': 0,
+        'prepared-lru': 32,
+    }
+
+    print(f"{'variant':>14} {'calls':>8} {'seconds':>10} {'us/call':>10} {'hit ratio':>10}")
+    for name, cache_size in variants.items():
+        pool = ConnectionPool(statement_cache_size=cache_size, **connect_args_from_env())
+        with pool.connection() as connection:
+            start = time.perf_counter()
+            for i in range(calls):
+                cursor = connection.statement_cursor(dictionary=True)
+                cursor.execute(query, (i % 100,))
+                cursor.fetchall()
+                cursor.close()
+            elapsed = time.perf_counter() - start
+        hit_ratio = pool.stats()['statement_hit_ratio']
+        pool.close()
+        print(f"{name:>14} {calls:>8} {elapsed:>10.2f} {elapsed * 1e6 / calls:>10.1f} {hit_ratio:>10.3f}")
+
+
+BENCHMARKS = {
+    'database_connection': bench_database_connection,
+    'statement_cache': bench_statement_cache,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: {sys.argv[0]} {{{'|'.join(BENCHMARKS)}}} [args...]")
+        sys.exit(1)
+    name, args = sys.argv[1], [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[name](*args)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ExecuteQuery in 1-execute.py. A fake connection stands
+in for MySQL behind a real one-connection ConnectionPool, so a leaked
+lease shows up as a timeout on the next acquire().
+"""
+import unittest
+from unittest.mock import patch
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+from db_pool import ConnectionPool
+
+execute = __import__('1-execute')
+
+
+class FakeCursor:
+    """Unbuffered cursor: close() refuses while rows are left unread."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, operation, params=None):
+        self.rows = [{'id': i} for i in range(5)]
+        self.connection.unread_result = True
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        if not self.rows:
+            self.connection.unread_result = False
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def close(self):
+        if self.connection.unread_result:
+            raise Error(msg="Unread result found")
+
+
+class FakeConnection:
+    """Raw connection handed out by the pool."""
+    def __init__(self):
+        self.unread_result = False
+        self.in_transaction = False
+        self.closed = False
+
+    def cursor(self, dictionary=False, prepared=False):
+        return FakeCursor(self)
+
+    def is_connected(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class TestExecuteQuery(unittest.TestCase):
+    """Tests that every way out of the with block returns the lease."""
+    def setUp(self):
+        self.pool = ConnectionPool(min_size=0, max_size=1)
+        patches = [
+            patch.object(self.pool, '_connect', FakeConnection),
+            patch.object(execute, 'get_connection', self.pool.acquire),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertLeaseReturned(self):
+        try:
+            self.pool.acquire(timeout=0.2).close()
+        except PoolError:
+            self.fail("the pooled connection was not returned")
+
+    def test_full_result(self):
+        """Fetching every row returns the connection for reuse."""
+        with execute.ExecuteQuery("SELECT id FROM users") as rows:
+            self.assertEqual(len(rows), 5)
+        self.assertLeaseReturned()
+        self.assertEqual(self.pool.stats()['closed'], 0)
+
+    def test_early_exit_from_plain_stream(self):
+        """Leaving a stream early over a plain cursor discards the connection."""
+        with execute.ExecuteQuery("SELECT id FROM users WHERE id > %(x)s",
+                                  {'x': 1}, stream='rows', chunk_size=2) as rows:
+            for _ in rows:
+                break
+        self.assertLeaseReturned()
+        self.assertEqual(self.pool.stats()['closed'], 1)
+
+    def test_early_exit_from_prepared_stream(self):
+        """Leaving a chunk stream early over a prepared cursor also frees the lease."""
+        with execute.ExecuteQuery("SELECT id FROM users WHERE id > %s", (1,),
+                                  stream='chunks', chunk_size=2) as chunks:
+            next(chunks)
+        self.assertLeaseReturned()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,51 +1,395 @@
-import mysql.connector
 from mysql.connector import Error
-from functools import wraps
+from db_pool import get_connection
+from collections import deque
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import atexit
+import json
+import queue
+import random
+import re
+import sys
+import threading
 import time
+import traceback
 from datetime import datetime
 
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    Collapses whitespace and replaces string and number literals with
+    '?', so the same statement with different values logs identically.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class AsyncBatchSink:
+    """
+    Log sink that never blocks the caller on I/O. Records are queued
+    and a background thread writes them as JSON lines, `batch_size`
+    at a time or every `flush_interval` seconds, whichever comes first.
+    """
+    def __init__(self, stream=None, batch_size=100, flush_interval=1.0):
+        self.stream = stream or sys.stderr
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, record):
+        self._queue.put(record)
+
+    def _run(self):
+        while not self._stopped.is_set() or not self._queue.empty():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self.stream.write(''.join(json.dumps(record) + '\n' for record in batch))
+                self.stream.flush()
+
+    def close(self):
+        """Flushes queued records and stops the writer thread."""
+        self._stopped.set()
+        self._thread.join()
+
+
+class QueryLogConfig:
+    """
+    Process-wide settings read by every log_queries wrapper.
+
+    - mode: 'console' prints per-call lines (the original behaviour),
+      'structured' emits one record per call to `sink`, 'off' skips
+      timing and logging entirely
+    - sample_rate: fraction of calls recorded in structured mode
+    - sink: anything with emit(record); an AsyncBatchSink by default
+    - histograms: time every statement into QUERY_METRICS, sampled or not
+    """
+    def __init__(self, mode='console', sample_rate=1.0, sink=None, histograms=True):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self._sink = sink
+        self.histograms = histograms
+
+    @property
+    def sink(self):
+        if self._sink is None:
+            self._sink = AsyncBatchSink()
+        return self._sink
+
+
+QUERY_LOG = QueryLogConfig()
+
+
+def configure_query_logging(mode=None, sample_rate=None, sink=None, histograms=None,
+                            slow_query_ms=None):
+    """Changes the query logging settings at runtime."""
+    if mode is not None:
+        if mode not in ('console', 'structured', 'off'):
+            raise ValueError(f"Unknown query logging mode: {mode!r}")
+        QUERY_LOG.mode = mode
+    if sample_rate is not None:
+        QUERY_LOG.sample_rate = sample_rate
+    if sink is not None:
+        QUERY_LOG._sink = sink
+    if histograms is not None:
+        QUERY_LOG.histograms = histograms
+    if slow_query_ms is not None:
+        QUERY_METRICS.slow_query_ns = int(slow_query_ms * 1_000_000)
+
+
+class RecordingCursor:
+    """
+    Cursor proxy that remembers the last statement executed and the
+    number of rows it affected or returned. Given `metrics`, it also
+    times every execute()/executemany() and files each statement's
+    latency under that statement, so a function running several
+    queries gets one observation per query.
+    """
+    def __init__(self, cursor, function=None, metrics=None):
+        self._cursor = cursor
+        self._function = function
+        self._metrics = metrics
+        self.statement = None
+        self.params = None
+        self.row_count = 0
+        self.observed = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _observe(self, start):
+        self.observed += 1
+        self._metrics.observe(self._function, self.statement, self.params,
+                              time.perf_counter_ns() - start)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self.statement = operation
+        self.params = params
+        start = time.perf_counter_ns()
+        try:
+            result = self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            if self._metrics is not None:
+                self._observe(start)
+        self.row_count = self._cursor.rowcount
+        return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self.statement = operation
+        self.params = seq_params
+        start = time.perf_counter_ns()
+        try:
+            result = self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            if self._metrics is not None:
+                self._observe(start)
+        self.row_count = self._cursor.rowcount
+        return result
+
+    def _fetched(self, rows):
+        # Unbuffered cursors only know their row count after fetching
+        self.row_count = max(self.row_count, self._cursor.rowcount)
+        return rows
+
+    def fetchone(self):
+        return self._fetched(self._cursor.fetchone())
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetched(self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._fetched(self._cursor.fetchall())
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of nanosecond latencies. Values are bucketed
+    by power of two with 2**significant_bits linear sub-buckets each,
+    so every recorded value keeps a relative error under
+    2**-significant_bits while memory stays logarithmic in the range.
+    """
+    def __init__(self, significant_bits=5):
+        self.significant_bits = significant_bits
+        self.buckets = {}
+        self.count = 0
+        self.total_ns = 0
+
+    def _bucket(self, value):
+        shift = max(0, value.bit_length() - self.significant_bits - 1)
+        return shift, value >> shift
+
+    def record(self, value_ns):
+        key = self._bucket(value_ns)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total_ns += value_ns
+
+    def percentile(self, p):
+        """Approximate p-th percentile (0-100) in nanoseconds."""
+        if self.count == 0:
+            return None
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for shift, sub_bucket in sorted(self.buckets, key=lambda key: key[1] << key[0]):
+            seen += self.buckets[(shift, sub_bucket)]
+            if seen >= rank:
+                # Midpoint of the sub-bucket's value range
+                return (sub_bucket << shift) + ((1 << shift) - 1) // 2
+        return None
+
+
+class QueryMetrics:
+    """
+    In-process registry of per-query latency histograms plus a ring
+    buffer of the slowest calls' SQL, parameters and call stacks.
+    """
+    def __init__(self, slow_query_ns=100_000_000, slow_log_size=100):
+        self.slow_query_ns = slow_query_ns
+        self.histograms = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def observe(self, function, statement, params, duration_ns):
+        query = normalize_sql(statement) if statement else function
+        with self._lock:
+            histogram = self.histograms.get(query)
+            if histogram is None:
+                histogram = self.histograms[query] = LatencyHistogram()
+            histogram.record(duration_ns)
+        if duration_ns >= self.slow_query_ns:
+            self.slow_queries.append({
+                'ts': time.time(),
+                'function': function,
+                'sql': statement,
+                'params': repr(params),
+                'duration_ns': duration_ns,
+                # Drop the frames for observe() and the RecordingCursor calls
+                'stack': traceback.format_stack()[:-3],
+            })
+
+    def summary(self):
+        """{normalised query: {'count', 'p50', 'p95', 'p99'}} in nanoseconds."""
+        with self._lock:
+            return {
+                query: {
+                    'count': histogram.count,
+                    'p50': histogram.percentile(50),
+                    'p95': histogram.percentile(95),
+                    'p99': histogram.percentile(99),
+                }
+                for query, histogram in self.histograms.items()
+            }
+
+    def export_prometheus(self):
+        """Renders the histograms as a Prometheus text-format summary."""
+        lines = [
+            "# HELP query_latency_seconds Latency of queries run through log_queries.",
+            "# TYPE query_latency_seconds summary",
+        ]
+        with self._lock:
+            for query, histogram in sorted(self.histograms.items()):
+                label = _prometheus_label(query)
+                for quantile in (0.5, 0.95, 0.99):
+                    value = histogram.percentile(quantile * 100) / 1e9
+                    lines.append(
+                        f'query_latency_seconds{{query="{label}",quantile="{quantile}"}} {value:.9f}'
+                    )
+                lines.append(f'query_latency_seconds_sum{{query="{label}"}} {histogram.total_ns / 1e9:.9f}')
+                lines.append(f'query_latency_seconds_count{{query="{label}"}} {histogram.count}')
+        lines.append("# HELP slow_queries_captured Slow queries currently in the ring buffer.")
+        lines.append("# TYPE slow_queries_captured gauge")
+        lines.append(f"slow_queries_captured {len(self.slow_queries)}")
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+QUERY_METRICS = QueryMetrics()
+
+
+def start_metrics_server(port=9105, host='127.0.0.1'):
+    """
+    Serves QUERY_METRICS.export_prometheus() at /metrics from a
+    background thread. Returns the server so callers can shut it down.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = QUERY_METRICS.export_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _call_logged(func, args, kwargs, connection, cursor, mode, sampled):
+    """
+    Runs func on a RecordingCursor, which times each statement into
+    the metrics, and emits one record per call to the sink.
+    """
+    metrics = QUERY_METRICS if QUERY_LOG.histograms else None
+    recording = RecordingCursor(cursor, func.__name__, metrics)
+    error = None
+    start = time.perf_counter_ns()
+    try:
+        return func(*args, connection=connection, cursor=recording, **kwargs)
+    except Error as e:
+        error = str(e)
+        raise
+    finally:
+        duration_ns = time.perf_counter_ns() - start
+        if metrics is not None and not recording.observed:
+            # No statement ran: file the call under the function name
+            QUERY_METRICS.observe(func.__name__, None, None, duration_ns)
+        if mode == 'structured' and sampled:
+            QUERY_LOG.sink.emit({
+                'ts': time.time(),
+                'function': func.__name__,
+                'sql': normalize_sql(recording.statement) if recording.statement else None,
+                'rows': recording.row_count,
+                'duration_ns': duration_ns,
+                'error': error,
+            })
+        elif mode == 'console' and error is None:
+            print(f"✅ '{func.__name__}' executed successfully in {duration_ns / 1e9:.4f}s")
+
+
 def log_queries(func):
     """
     Decorator that logs SQL queries executed by a function
     using mysql.connector instead of Django ORM.
+    Output is controlled by configure_query_logging(); unless logging
+    is off, every statement also feeds the QUERY_METRICS latency registry.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
         connection = None
         cursor = None
+        mode = QUERY_LOG.mode
 
         try:
-            # Connect to MySQL
-            connection = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='your_password',  # <-- replace with your password
-                database='ALX_prodev'
-            )
-            cursor = connection.cursor()
-
-            print(f"🔗 Connected to MySQL for '{func.__name__}'")
+            # Lease a connection from the shared pool
+            connection = get_connection()
+            # Repeated queries reuse the connection's prepared statements
+            cursor = connection.statement_cursor()
 
-            # Start timing
-            start_time = time.time()
+            if mode == 'off':
+                return func(*args, connection=connection, cursor=cursor, **kwargs)
 
-            # Pass the cursor or connection to the wrapped function
-            result = func(*args, connection=connection, cursor=cursor, **kwargs)
+            sampled = mode == 'console' or random.random() < QUERY_LOG.sample_rate
+            if not sampled and not QUERY_LOG.histograms:
+                return func(*args, connection=connection, cursor=cursor, **kwargs)
 
-            # End timing
-            elapsed = time.time() - start_time
-            print(f"✅ '{func.__name__}' executed successfully in {elapsed:.4f}s")
+            if mode == 'console':
+                print(f"🔗 Connected to MySQL for '{func.__name__}'")
 
-            return result
+            # Pass the cursor or connection to the wrapped function
+            return _call_logged(func, args, kwargs, connection, cursor, mode, sampled)
 
         except Error as e:
-            print(f"❌ Database error in '{func.__name__}': {e}")
+            # Structured records already carry the error
+            if mode != 'structured':
+                print(f"❌ Database error in '{func.__name__}': {e}")
 
         finally:
             if cursor:
                 cursor.close()
-            if connection and connection.is_connected():
+            if connection:
                 connection.close()
-                print(f"🔒 MySQL connection closed for '{func.__name__}'")
+                if mode == 'console':
+                    print(f"🔒 MySQL connection returned to pool for '{func.__name__}'")
 
     return wrapper
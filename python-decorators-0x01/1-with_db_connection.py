@@ -1,38 +1,55 @@
-import mysql.connector
+from contextvars import ContextVar
 from mysql.connector import Error
+from db_pool import get_connection
 from functools import wraps
 
-def with_db_connection(func):
+# Connection leased by the outermost decorated call in this context
+_current_connection = ContextVar('current_connection', default=None)
+
+
+def with_db_connection(func=None, *, timeout=None):
     """
-    Decorator that automatically handles opening and closing
+    Decorator that automatically handles leasing and returning
     a MySQL database connection for the wrapped function.
+
+    - timeout: seconds to wait for a pooled connection (None waits forever)
+
+    Decorated functions called from inside another decorated function
+    reuse the caller's connection instead of leasing a second one.
+    Use it bare (@with_db_connection) or with arguments
+    (@with_db_connection(timeout=5)).
     """
+    if func is None:
+        return lambda f: with_db_connection(f, timeout=timeout)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
+        outer = _current_connection.get()
+        if outer is not None:
+            # Reentrant call: run on the caller's connection
+            return func(*args, connection=outer, **kwargs)
+
         connection = None
+        token = None
         try:
-            # Open connection
-            connection = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='your_password',  # <-- replace with your DB password
-                database='ALX_prodev'
-            )
-
-            if connection.is_connected():
-                print(f"✅ Database connected for '{func.__name__}'")
+            # Lease a connection from the shared pool
+            connection = get_connection(timeout)
+            token = _current_connection.set(connection)
+            print(f"✅ Database connected for '{func.__name__}'")
 
-                # Pass the connection as a keyword argument
-                result = func(*args, connection=connection, **kwargs)
-                return result
+            # Pass the connection as a keyword argument
+            result = func(*args, connection=connection, **kwargs)
+            return result
 
         except Error as e:
             print(f"❌ Database error in '{func.__name__}':", e)
 
         finally:
-            # Close the connection automatically
-            if connection and connection.is_connected():
+            if token is not None:
+                _current_connection.reset(token)
+            # Return the connection to the pool automatically
+            if connection:
                 connection.close()
-                print(f"🔒 Database connection closed after '{func.__name__}'")
+                print(f"🔒 Database connection returned to pool after '{func.__name__}'")
 
     return wrapper
@@ -1,45 +1,399 @@
-import mysql.connector
+from contextlib import contextmanager
+from contextvars import ContextVar
+import itertools
+import random
+import threading
+import time
 from mysql.connector import Error
+from db_pool import get_connection
 from functools import wraps
+from table_events import ALL_TABLES, is_read_only, publish_writes, tables_written
 
-def transactional(func):
+
+class WriteTrackingCursor:
+    """
+    Cursor proxy that collects the tables written by the statements
+    executed through it, so they can be announced after commit. A
+    statement that may write but names no table it can parse is
+    recorded as ALL_TABLES, so caches are cleared rather than left stale.
+    Cursors of one WriteTrackingConnection share its `tables` set.
+    """
+    def __init__(self, cursor, tables=None):
+        self._cursor = cursor
+        self.tables = set() if tables is None else tables
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _track(self, operation):
+        written = tables_written(operation)
+        if not written and not is_read_only(operation):
+            written = {ALL_TABLES}
+        self.tables |= written
+
+    def execute(self, operation, *args, **kwargs):
+        self._track(operation)
+        return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        self._track(operation)
+        return self._cursor.executemany(operation, *args, **kwargs)
+
+
+class WriteTrackingConnection:
+    """
+    Connection proxy handed to transactional functions. Every cursor
+    it opens is a WriteTrackingCursor, so writes made through
+    `connection.cursor()` are announced as well as those made through
+    the injected cursor. Other attributes go to the real connection.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+        self.tables = set()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return WriteTrackingCursor(self._connection.cursor(*args, **kwargs), self.tables)
+
+    def statement_cursor(self, *args, **kwargs):
+        return WriteTrackingCursor(self._connection.statement_cursor(*args, **kwargs), self.tables)
+
+
+# Lock wait timeout and deadlock: the transaction lost a lock race and
+# can succeed if it is run again from the start
+CONFLICT_ERRNOS = {
+    1205,  # ER_LOCK_WAIT_TIMEOUT
+    1213,  # ER_LOCK_DEADLOCK
+}
+
+
+def is_conflict(error):
+    return getattr(error, 'errno', None) in CONFLICT_ERRNOS
+
+
+class TransactionConflictError(Error):
+    """
+    A transaction kept losing lock races after max_attempts runs, or
+    its replay could not reproduce work callers had already been told
+    succeeded. The transaction is rolled back; nothing was committed.
+    """
+
+
+def replay_delay(attempt, base_delay, max_delay):
+    """Full-jitter backoff before replay number `attempt` (1-based)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class ConflictStats:
+    """
+    Per-function counters of transactional calls, lock conflicts,
+    replays and calls that gave up after max_attempts.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, name, event):
+        with self._lock:
+            counters = self._counters.setdefault(
+                name, dict.fromkeys(('calls', 'conflicts', 'replays', 'gave_up'), 0)
+            )
+            counters[event] += 1
+
+    def snapshot(self):
+        """{function: counters plus conflict_rate (conflicts per call)}."""
+        with self._lock:
+            return {
+                name: {**counters,
+                       'conflict_rate': counters['conflicts'] / counters['calls'] if counters['calls'] else 0.0}
+                for name, counters in self._counters.items()
+            }
+
+
+CONFLICT_STATS = ConflictStats()
+
+
+def conflict_stats():
+    """Conflict counters for every transactional function so far."""
+    return CONFLICT_STATS.snapshot()
+
+
+class TransactionScope:
+    """
+    One connection and one open transaction shared by every
+    transactional call made inside it. Each call runs under its own
+    savepoint, so a failing call is rolled back alone. The transaction
+    is committed every `flush_size` calls or `flush_interval` seconds
+    (whichever comes first, checked between calls) and when the scope
+    ends, so a bulk loop pays one commit per flush instead of per row.
+
+    A deadlock or lock wait timeout aborts the whole transaction, so
+    the scope journals the calls made since the last commit and, on a
+    conflict, rolls back and replays them up to `max_attempts` times.
+    """
+    def __init__(self, connection, flush_size=None, flush_interval=None,
+                 max_attempts=3, base_delay=0.05, max_delay=1.0):
+        self.connection = connection
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pending = 0
+        self.depth = 0
+        self.tables = set()
+        self.journal = []
+        self._savepoints = itertools.count(1)
+        self._last_flush = time.monotonic()
+
+    def commit(self):
+        """Commits the shared transaction and announces the tables it wrote."""
+        self.connection.commit()
+        tables, self.tables = self.tables, set()
+        self.pending = 0
+        self.journal = []
+        self._last_flush = time.monotonic()
+        publish_writes(tables)
+
+    def rollback(self):
+        self.connection.rollback()
+        self.tables = set()
+        self.pending = 0
+        self.journal = []
+
+    def _due(self):
+        if self.depth or not self.pending:
+            return False
+        if self.flush_size and self.pending >= self.flush_size:
+            return True
+        return bool(self.flush_interval) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _run_once(self, func, args, kwargs):
+        """
+        Runs one call under a savepoint. Returns (True, result), or
+        (False, None) if it failed and was rolled back to the savepoint.
+        Conflicts are raised: the savepoint died with the transaction.
+        """
+        savepoint = f"tx_sp_{next(self._savepoints)}"
+        control = self.connection.cursor()
+        tracked = WriteTrackingConnection(self.connection)
+        cursor = tracked.statement_cursor(dictionary=True)
+        control.execute(f"SAVEPOINT {savepoint}")
+        self.depth += 1
+        try:
+            result = func(*args, connection=tracked, cursor=cursor, **kwargs)
+        except Error as e:
+            if is_conflict(e):
+                raise
+            control.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            print(f"⚠️ '{func.__name__}' rolled back to savepoint due to error: {e}")
+            return False, None
+        else:
+            control.execute(f"RELEASE SAVEPOINT {savepoint}")
+            self.tables |= tracked.tables
+            return True, result
+        finally:
+            self.depth -= 1
+            cursor.close()
+            control.close()
+
+    def _replay(self, func, args, kwargs):
+        """
+        Rolls back and re-runs the journal plus this call after a
+        conflict. Journaled calls already returned to their callers, so
+        if any of them fails on replay the whole transaction is rolled
+        back and TransactionConflictError raised: committing the rest
+        would silently drop that call's writes.
+        """
+        for attempt in range(1, self.max_attempts):
+            self.connection.rollback()
+            self.tables = set()
+            CONFLICT_STATS.record(func.__name__, 'replays')
+            wait = replay_delay(attempt, self.base_delay, self.max_delay)
+            print(f"🔁 Lock conflict in '{func.__name__}'; replaying "
+                  f"{len(self.journal) + 1} call(s) in {wait:.3f}s...")
+            time.sleep(wait)
+            try:
+                for journaled in self.journal:
+                    ok, _ = self._run_once(*journaled)
+                    if not ok:
+                        self.rollback()
+                        raise TransactionConflictError(
+                            f"Replay after a lock conflict in '{func.__name__}' failed in "
+                            f"'{journaled[0].__name__}'; transaction rolled back"
+                        )
+                return self._run_once(func, args, kwargs)
+            except TransactionConflictError:
+                raise
+            except Error as e:
+                if not is_conflict(e):
+                    raise
+                CONFLICT_STATS.record(func.__name__, 'conflicts')
+        CONFLICT_STATS.record(func.__name__, 'gave_up')
+        self.rollback()
+        raise TransactionConflictError(
+            f"'{func.__name__}' still conflicting after {self.max_attempts} attempts; "
+            f"transaction rolled back"
+        )
+
+    def run(self, func, args, kwargs):
+        """Runs one transactional call under a savepoint of the shared transaction."""
+        top = self.depth == 0
+        if top:
+            CONFLICT_STATS.record(func.__name__, 'calls')
+        try:
+            ok, result = self._run_once(func, args, kwargs)
+        except Error as e:
+            # Only the outermost call can replay; nested ones pass the conflict up
+            if not (top and is_conflict(e)):
+                raise
+            CONFLICT_STATS.record(func.__name__, 'conflicts')
+            ok, result = self._replay(func, args, kwargs)
+
+        if top and ok:
+            self.journal.append((func, args, kwargs))
+            self.pending += 1
+            if self._due():
+                self.commit()
+        return result
+
+
+# Scope that transactional calls in this context join
+_active_scope = ContextVar('active_transaction_scope', default=None)
+
+
+@contextmanager
+def transaction_batch(flush_size=100, flush_interval=None, timeout=None, max_attempts=3):
+    """
+    Group-commit scope for bulk jobs:
+
+        with transaction_batch(flush_size=500):
+            for row in rows:
+                insert_row(row)  # a @transactional function
+
+    Every transactional call inside shares one pooled connection and
+    transaction (see TransactionScope). Work still pending is committed
+    when the block ends, or rolled back if it raises. Lock conflicts
+    replay the calls since the last commit up to `max_attempts` times.
+    """
+    outer = _active_scope.get()
+    if outer is not None:
+        # Already inside a scope: join it rather than opening a second one
+        yield outer
+        return
+
+    connection = get_connection(timeout)
+    scope = TransactionScope(connection, flush_size, flush_interval, max_attempts)
+    token = _active_scope.set(scope)
+    try:
+        yield scope
+        if scope.pending:
+            scope.commit()
+    except BaseException:
+        scope.rollback()
+        raise
+    finally:
+        _active_scope.reset(token)
+        connection.close()
+
+
+def transactional(func=None, *, max_attempts=3, base_delay=0.05, max_delay=1.0):
     """
     Decorator that manages a database transaction automatically.
     It commits on success and rolls back on error.
+    After a commit, the tables the transaction wrote are published
+    (see table_events) so cached reads of them are invalidated.
+    Calls made inside another transactional call or a
+    transaction_batch() block join that transaction under a savepoint.
+
+    A deadlock or lock wait timeout rolls back and replays the whole
+    function, up to `max_attempts` runs, with full-jitter backoff
+    between replays (base_delay doubling, capped at max_delay seconds).
+    If it still conflicts, TransactionConflictError is raised instead
+    of returning None. Per-function counters are available from
+    conflict_stats().
+    Use it bare (@transactional) or with arguments
+    (@transactional(max_attempts=5)).
     """
+    if func is None:
+        return lambda f: transactional(
+            f, max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay
+        )
+
     @wraps(func)
     def wrapper(*args, **kwargs):
+        scope = _active_scope.get()
+        if scope is not None:
+            return scope.run(func, args, kwargs)
+
         connection = None
+        token = None
+        CONFLICT_STATS.record(func.__name__, 'calls')
         try:
-            # Open database connection
-            connection = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='your_password',  # <-- replace with your MySQL password
-                database='ALX_prodev'
-            )
+            # Lease a connection from the shared pool
+            connection = get_connection()
+            scope = TransactionScope(connection, max_attempts=max_attempts,
+                                     base_delay=base_delay, max_delay=max_delay)
+            # Nested calls run as inner savepoints; conflicts replay from here
+            scope.depth = 1
+            token = _active_scope.set(scope)
 
-            if connection.is_connected():
-                cursor = connection.cursor(dictionary=True)
-                print(f"✅ Transaction started for '{func.__name__}'")
+            for attempt in itertools.count(1):
+                # Writes through any cursor of `tracked` are announced on commit
+                tracked = WriteTrackingConnection(connection)
+                cursor = tracked.statement_cursor(dictionary=True)
+                try:
+                    print(f"✅ Transaction started for '{func.__name__}'")
 
-                # Inject connection and cursor into function
-                result = func(*args, connection=connection, cursor=cursor, **kwargs)
+                    # Inject connection and cursor into function
+                    result = func(*args, connection=tracked, cursor=cursor, **kwargs)
 
-                # Commit changes if successful
-                connection.commit()
-                print(f"💾 Transaction committed for '{func.__name__}'")
-                return result
+                    # Commit changes if successful
+                    scope.tables |= tracked.tables
+                    scope.commit()
+                    print(f"💾 Transaction committed for '{func.__name__}'")
+                    return result
 
+                except Error as e:
+                    if not is_conflict(e):
+                        raise
+                    CONFLICT_STATS.record(func.__name__, 'conflicts')
+                    if attempt >= max_attempts:
+                        CONFLICT_STATS.record(func.__name__, 'gave_up')
+                        raise TransactionConflictError(
+                            f"'{func.__name__}' still conflicting after {max_attempts} attempts: {e}"
+                        ) from e
+                    # The server already rolled back; start the next run clean
+                    scope.rollback()
+                    CONFLICT_STATS.record(func.__name__, 'replays')
+                    wait = replay_delay(attempt, base_delay, max_delay)
+                    print(f"🔁 Lock conflict in '{func.__name__}' ({e}); "
+                          f"replaying ({attempt}/{max_attempts - 1}) in {wait:.3f}s...")
+                    time.sleep(wait)
+                finally:
+                    cursor.close()
+
+        except TransactionConflictError:
+            # Giving up on a conflict must not look like a None result
+            if connection:
+                connection.rollback()
+                print(f"⚠️ Transaction rolled back for '{func.__name__}': gave up after lock conflicts")
+            raise
         except Error as e:
             # Roll back if error occurs
             if connection:
                 connection.rollback()
                 print(f"⚠️ Transaction rolled back for '{func.__name__}' due to error: {e}")
         finally:
-            if connection and connection.is_connected():
-                cursor.close()
+            if token is not None:
+                _active_scope.reset(token)
+            if connection:
                 connection.close()
-                print(f"🔒 Connection closed for '{func.__name__}'")
+                print(f"🔒 Connection returned to pool for '{func.__name__}'")
 
     return wrapper
@@ -1,14 +1,101 @@
+import asyncio
+import inspect
+import random
+import threading
 import time
 import mysql.connector
-from mysql.connector import Error, OperationalError, InterfaceError, DatabaseError
+from mysql.connector import (
+    Error, OperationalError, InterfaceError, DatabaseError,
+    IntegrityError, ProgrammingError, DataError, NotSupportedError,
+)
 from functools import wraps
 
-def retry_on_failure(max_retries=3, delay=2, backoff=2):
+# Server/client error codes worth retrying even when they arrive as
+# a plain DatabaseError
+TRANSIENT_ERRNOS = {
+    1040,  # ER_CON_COUNT_ERROR: too many connections
+    1053,  # ER_SERVER_SHUTDOWN
+    1205,  # ER_LOCK_WAIT_TIMEOUT
+    1213,  # ER_LOCK_DEADLOCK
+    2003,  # CR_CONN_HOST_ERROR: can't connect
+    2006,  # CR_SERVER_GONE_ERROR
+    2013,  # CR_SERVER_LOST
+    2055,  # CR_SERVER_LOST_EXTENDED
+}
+
+# Errors that will fail the same way however often they are retried
+PERMANENT_ERRORS = (IntegrityError, ProgrammingError, DataError, NotSupportedError)
+
+
+def is_retryable(error):
+    """
+    Classifies a database error as transient (worth retrying) or
+    permanent. Constraint violations, bad SQL and bad data are permanent.
+    """
+    if isinstance(error, PERMANENT_ERRORS):
+        return False
+    if getattr(error, 'errno', None) in TRANSIENT_ERRNOS:
+        return True
+    return isinstance(error, (OperationalError, InterfaceError))
+
+
+class RetryBudget:
+    """
+    Process-wide token bucket that caps retries as a share of traffic.
+    Every retry spends one token and every success earns back
+    `token_ratio`; retries are refused while the bucket is at or below
+    half full. During an outage the budget drains quickly, so failing
+    calls stop multiplying load on the database.
+    """
+    def __init__(self, max_tokens=10.0, token_ratio=0.1):
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.token_ratio)
+
+    def try_spend(self):
+        """Returns True and spends a token if a retry is allowed."""
+        with self._lock:
+            if self._tokens <= self.max_tokens / 2:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+
+def backoff_delay(attempt, delay, backoff, max_delay, jitter=True):
+    """
+    Delay before retry number `attempt` (1-based). With full jitter the
+    delay is uniform between 0 and the exponential cap, which spreads
+    out clients that failed at the same moment.
+    """
+    cap = min(max_delay, delay * backoff ** (attempt - 1))
+    return random.uniform(0, cap) if jitter else cap
+
+
+def retry_on_failure(max_retries=3, delay=2, backoff=2, max_delay=30, jitter=True,
+                     budget=DEFAULT_RETRY_BUDGET):
     """
     Decorator that retries a database operation if it fails due to transient errors.
     - max_retries: number of times to retry
     - delay: initial delay (seconds)
     - backoff: multiplier for exponential backoff (delay *= backoff)
+    - max_delay: upper bound for a single delay (seconds)
+    - jitter: use full-jitter delays instead of fixed exponential ones
+    - budget: RetryBudget shared by decorated functions (None disables it)
+
+    Permanent errors (see is_retryable) are raised immediately.
+    Coroutine functions get an async wrapper that awaits between attempts.
     """
     transient_errors = (
         OperationalError,
@@ -16,26 +103,58 @@ def retry_on_failure(max_retries=3, delay=2, backoff=2):
         DatabaseError,
     )
 
+    def should_retry(func, retries, e):
+        if not is_retryable(e):
+            print(f"❌ Non-retryable DB error in '{func.__name__}': {e}")
+            return False
+        print(f"⚠️ Transient DB error in '{func.__name__}': {e}")
+        if retries >= max_retries:
+            print(f"❌ Max retries reached for '{func.__name__}'. Operation failed.")
+            return False
+        if budget is not None and not budget.try_spend():
+            print(f"❌ Retry budget exhausted; not retrying '{func.__name__}'.")
+            return False
+        return True
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                retries = 0
+                while True:
+                    try:
+                        # Attempt database operation
+                        result = await func(*args, **kwargs)
+                    except transient_errors as e:
+                        retries += 1
+                        if not should_retry(func, retries, e):
+                            raise
+                        wait = backoff_delay(retries, delay, backoff, max_delay, jitter)
+                        print(f"🔁 Retrying ({retries}/{max_retries}) in {wait:.2f}s...")
+                        await asyncio.sleep(wait)
+                    else:
+                        if budget is not None:
+                            budget.record_success()
+                        return result
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             retries = 0
-            current_delay = delay
-
-            while retries < max_retries:
+            while True:
                 try:
                     # Attempt database operation
-                    return func(*args, **kwargs)
-
+                    result = func(*args, **kwargs)
                 except transient_errors as e:
                     retries += 1
-                    print(f"⚠️ Transient DB error in '{func.__name__}': {e}")
-                    if retries < max_retries:
-                        print(f"🔁 Retrying ({retries}/{max_retries}) in {current_delay}s...")
-                        time.sleep(current_delay)
-                        current_delay *= backoff
-                    else:
-                        print(f"❌ Max retries reached for '{func.__name__}'. Operation failed.")
+                    if not should_retry(func, retries, e):
                         raise
+                    wait = backoff_delay(retries, delay, backoff, max_delay, jitter)
+                    print(f"🔁 Retrying ({retries}/{max_retries}) in {wait:.2f}s...")
+                    time.sleep(wait)
+                else:
+                    if budget is not None:
+                        budget.record_success()
+                    return result
         return wrapper
     return decorator
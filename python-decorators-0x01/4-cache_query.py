@@ -1,39 +1,709 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 from functools import wraps
 import hashlib
+import heapq
+import itertools
+import mmap
+import os
 import pickle
+import struct
+import sys
+import threading
 import time
+import weakref
+import zlib
+from table_events import ALL_TABLES, subscribe, tables_read
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+# lookup() results
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+def _sizeof(value):
+    """Approximate memory cost of a cached value (its pickled size)."""
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Shard:
+    """One independently locked slice of the cache, with its own counters."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, expires_at, size, stale_until), LRU first
+        self.expiries = []            # heap of (stale_until, sequence, key)
+        self.sequence = itertools.count()  # tie-breaker so keys are never compared
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class CacheEngine:
+    """
+    Bounded in-memory cache with LRU eviction and TTL expiry.
+
+    - max_entries / max_bytes: limits for the whole cache; the least
+      recently used entries are evicted to stay under them
+    - shards: keys are spread over this many independently locked
+      shards, so lookups on different keys do not contend
+    - reap_interval: seconds between background sweeps that drop
+      expired entries even if they are never looked up again. A forked
+      child (e.g. a gunicorn worker) starts its own sweeper thread.
+    """
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, shards=16,
+                 reap_interval=5.0, sizeof=_sizeof):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_entries = max(1, max_entries // shards)
+        self._max_bytes = max(1, max_bytes // shards)
+        self._sizeof = sizeof
+        self._reap_interval = reap_interval
+        if reap_interval:
+            self._start_reaper()
+        _engines.add(self)
+
+    def _start_reaper(self):
+        reaper = threading.Thread(target=self._reap_forever, args=(self._reap_interval,), daemon=True)
+        reaper.start()
+
+    def _after_fork(self):
+        """
+        Runs in a forked child, where only the forking thread survives:
+        locks another thread held at fork time would never be released,
+        and the sweeper thread is gone.
+        """
+        for shard in self._shards:
+            shard.lock = threading.Lock()
+        if self._reap_interval:
+            self._start_reaper()
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def lookup(self, key):
+        """
+        Returns (FRESH, value), (STALE, value) for an entry past its TTL
+        but inside its stale window, or (MISS, None).
+        """
+        shard = self._shard(key)
+        now = time.monotonic()
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    shard.entries.move_to_end(key)
+                    shard.hits += 1
+                    return FRESH, entry[0]
+                if entry[3] > now:
+                    shard.entries.move_to_end(key)
+                    shard.stale_hits += 1
+                    return STALE, entry[0]
+                self._remove(shard, key)
+                shard.expirations += 1
+            shard.misses += 1
+        return MISS, None
+
+    def peek_many(self, keys):
+        """
+        {key: value} for the keys with a fresh entry. Bookkeeping reads
+        such as table versions use this, so they leave the hit and miss
+        counters alone.
+        """
+        found = {}
+        now = time.monotonic()
+        for key in keys:
+            shard = self._shard(key)
+            with shard.lock:
+                entry = shard.entries.get(key)
+                if entry is not None and entry[1] > now:
+                    shard.entries.move_to_end(key)
+                    found[key] = entry[0]
+        return found
+
+    def get(self, key):
+        """Returns (True, value) on a fresh hit and (False, None) otherwise."""
+        status, value = self.lookup(key)
+        if status is FRESH:
+            return True, value
+        return False, None
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """
+        Caches `value` for `ttl` seconds. For `stale_ttl` seconds after
+        that, lookup() still returns it marked STALE.
+        """
+        size = self._sizeof(value)
+        if size > self._max_bytes:
+            return  # would evict the whole shard; not worth caching
+        shard = self._shard(key)
+        expires_at = time.monotonic() + ttl
+        stale_until = expires_at + stale_ttl
+        with shard.lock:
+            if key in shard.entries:
+                self._remove(shard, key)
+            shard.entries[key] = (value, expires_at, size, stale_until)
+            shard.bytes += size
+            heapq.heappush(shard.expiries, (stale_until, next(shard.sequence), key))
+            while len(shard.entries) > self._max_entries or shard.bytes > self._max_bytes:
+                oldest = next(iter(shard.entries))
+                self._remove(shard, oldest)
+                shard.evictions += 1
+
+    def delete(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.entries:
+                self._remove(shard, key)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiries.clear()
+                shard.bytes = 0
+
+    @staticmethod
+    def _remove(shard, key):
+        """Drops an entry. Its heap item is discarded lazily. Caller holds the lock."""
+        size = shard.entries.pop(key)[2]
+        shard.bytes -= size
+
+    def reap(self):
+        """Drops every expired entry now. Returns how many were dropped."""
+        now = time.monotonic()
+        expired = 0
+        for shard in self._shards:
+            with shard.lock:
+                while shard.expiries and shard.expiries[0][0] <= now:
+                    stale_until, _, key = heapq.heappop(shard.expiries)
+                    entry = shard.entries.get(key)
+                    # Skip heap items left behind by overwritten or evicted entries
+                    if entry is not None and entry[3] == stale_until:
+                        self._remove(shard, key)
+                        shard.expirations += 1
+                        expired += 1
+                if len(shard.expiries) > 2 * len(shard.entries) + 64:
+                    shard.expiries = [
+                        (entry[3], next(shard.sequence), key)
+                        for key, entry in shard.entries.items()
+                    ]
+                    heapq.heapify(shard.expiries)
+        return expired
+
+    def _reap_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reap()
+
+    def stats(self):
+        totals = dict.fromkeys(
+            ('entries', 'bytes', 'hits', 'stale_hits', 'misses', 'evictions', 'expirations'), 0
+        )
+        for shard in self._shards:
+            with shard.lock:
+                totals['entries'] += len(shard.entries)
+                totals['bytes'] += shard.bytes
+                totals['hits'] += shard.hits
+                totals['stale_hits'] += shard.stale_hits
+                totals['misses'] += shard.misses
+                totals['evictions'] += shard.evictions
+                totals['expirations'] += shard.expirations
+        return totals
+
+
+# Every CacheEngine, so forked children can restart their sweepers
+_engines = weakref.WeakSet()
+
+
+def _reinit_engines_after_fork():
+    for engine in list(_engines):
+        engine._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):  # not available on Windows
+    os.register_at_fork(after_in_child=_reinit_engines_after_fork)
+
+
+class _Call:
+    """A computation in flight, shared by every caller of the same key."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent computations of the same key: the first
+    caller runs it, later callers wait for and share its outcome.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_in_background(self, key, fn):
+        """Starts fn on a thread unless `key` is already being computed."""
+        with self._lock:
+            if key in self._calls:
+                return
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception as e:
+                print(f"⚠️ Background cache refresh failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+# ----------------------------------------
+# Cache backends
+# ----------------------------------------
+# Every backend offers lookup(key), peek_many(keys),
+# set(key, value, ttl, stale_ttl), delete(key), clear() and stats(). CacheEngine is the in-process
+# backend; the two below are shared between processes, so they key
+# entries by a digest of the pickled key and store values in one
+# compact encoding (pickle, zlib-compressed when that pays off).
+
+_COMPRESS_OVER = 1024
+
+
+def encode_value(value):
+    """Serialises a value once: a flag byte, then pickle (maybe zlib'd)."""
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) > _COMPRESS_OVER:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return b'z' + compressed
+    return b'p' + data
+
+
+def decode_value(payload):
+    data = payload[1:]
+    if payload[:1] == b'z':
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+def key_digest(key):
+    """Process-independent 16-byte digest of a cache key."""
+    if isinstance(key, str) and len(key) == 64:
+        data = key.encode()  # already a SHA-256 hex key
+    else:
+        data = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class SharedMemoryBackend:
+    """
+    Cache shared by every process on a host through one mmap'd file.
+
+    The file is a fixed hash table of `buckets` buckets with
+    `slots_per_bucket` slots of `slot_size` bytes each. A key lives in
+    one bucket, picked by its digest; when the bucket is full the slot
+    closest to expiry is overwritten. Each bucket is guarded by a POSIX
+    record lock on its byte range (between processes) and a striped
+    thread lock (within a process), so there is no global lock.
+    Values that do not fit in a slot are not cached.
+    """
+    _HEADER = struct.Struct('<16sddI')  # digest, expires_at, stale_until, length
+
+    def __init__(self, path, buckets=4096, slots_per_bucket=4, slot_size=4096):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryBackend needs POSIX fcntl locks")
+        self.path = path
+        self.buckets = buckets
+        self.slots_per_bucket = slots_per_bucket
+        self.slot_size = slot_size
+        self._bucket_bytes = slots_per_bucket * slot_size
+        size = buckets * self._bucket_bytes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+        self._counter_lock = threading.Lock()
+        self.counters = dict.fromkeys(('hits', 'stale_hits', 'misses', 'sets', 'evictions'), 0)
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    @contextmanager
+    def _locked(self, bucket):
+        offset = bucket * self._bucket_bytes
+        with self._thread_locks[bucket % len(self._thread_locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._bucket_bytes, offset)
+            try:
+                yield offset
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._bucket_bytes, offset)
+
+    def _slots(self, offset):
+        for slot in range(self.slots_per_bucket):
+            position = offset + slot * self.slot_size
+            yield position, self._HEADER.unpack_from(self._map, position)
+
+    def _locate(self, key):
+        digest = key_digest(key)
+        return digest, int.from_bytes(digest[:8], 'little') % self.buckets
+
+    def lookup(self, key):
+        digest, bucket = self._locate(key)
+        now = time.time()
+        payload = None
+        with self._locked(bucket) as offset:
+            for position, (slot_digest, expires_at, stale_until, length) in self._slots(offset):
+                if length and slot_digest == digest and stale_until > now:
+                    start = position + self._HEADER.size
+                    payload = self._map[start:start + length]
+                    break
+        if payload is None:
+            self._count('misses')
+            return MISS, None
+        if expires_at > now:
+            self._count('hits')
+            return FRESH, decode_value(payload)
+        self._count('stale_hits')
+        return STALE, decode_value(payload)
+
+    def peek_many(self, keys):
+        """{key: value} for the keys with a fresh entry, without counting."""
+        found = {}
+        now = time.time()
+        for key in keys:
+            digest, bucket = self._locate(key)
+            with self._locked(bucket) as offset:
+                for position, (slot_digest, expires_at, _, length) in self._slots(offset):
+                    if length and slot_digest == digest and expires_at > now:
+                        start = position + self._HEADER.size
+                        found[key] = decode_value(self._map[start:start + length])
+                        break
+        return found
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        payload = encode_value(value)
+        if len(payload) > self.slot_size - self._HEADER.size:
+            return
+        digest, bucket = self._locate(key)
+        now = time.time()
+        header = self._HEADER.pack(digest, now + ttl, now + ttl + stale_ttl, len(payload))
+        with self._locked(bucket) as offset:
+            target = None
+            oldest = None
+            for position, (slot_digest, _, stale_until, length) in self._slots(offset):
+                if length and slot_digest == digest:
+                    target = position
+                    break
+                if target is None and (not length or stale_until <= now):
+                    target = position
+                if oldest is None or stale_until < oldest[1]:
+                    oldest = (position, stale_until)
+            if target is None:
+                target = oldest[0]
+                self._count('evictions')
+            self._map[target:target + len(header)] = header
+            start = target + len(header)
+            self._map[start:start + len(payload)] = payload
+        self._count('sets')
+
+    def delete(self, key):
+        digest, bucket = self._locate(key)
+        with self._locked(bucket) as offset:
+            for position, (slot_digest, _, _, length) in self._slots(offset):
+                if length and slot_digest == digest:
+                    self._HEADER.pack_into(self._map, position, b'', 0.0, 0.0, 0)
+
+    def clear(self):
+        empty = bytes(self._HEADER.size)
+        for bucket in range(self.buckets):
+            with self._locked(bucket) as offset:
+                for slot in range(self.slots_per_bucket):
+                    position = offset + slot * self.slot_size
+                    self._map[position:position + len(empty)] = empty
+
+    def stats(self):
+        """Counters for this process only; the table itself is shared."""
+        with self._counter_lock:
+            return dict(self.counters)
+
+
+class DjangoCacheBackend:
+    """
+    Adapter onto Django's cache framework (memcached, Redis, database
+    cache...). Entries are stored as one bytes envelope: expiry times
+    followed by the encode_value() payload, so the value is serialised
+    once here and the Django backend only frames raw bytes.
+    """
+    _ENVELOPE = struct.Struct('<dd')  # expires_at, stale_until
+
+    def __init__(self, alias='default', prefix='cache_query'):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+        self.prefix = prefix
+        self._counter_lock = threading.Lock()
+        self.counters = dict.fromkeys(('hits', 'stale_hits', 'misses', 'sets'), 0)
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def _key(self, key):
+        return f"{self.prefix}:{key_digest(key).hex()}"
+
+    def lookup(self, key):
+        envelope = self._cache.get(self._key(key))
+        now = time.time()
+        if envelope is None:
+            self._count('misses')
+            return MISS, None
+        expires_at, stale_until = self._ENVELOPE.unpack_from(envelope)
+        if stale_until <= now:
+            self._count('misses')
+            return MISS, None
+        value = decode_value(envelope[self._ENVELOPE.size:])
+        if expires_at > now:
+            self._count('hits')
+            return FRESH, value
+        self._count('stale_hits')
+        return STALE, value
+
+    def peek_many(self, keys):
+        """
+        {key: value} for the keys with a fresh entry, fetched in one
+        get_many() round trip and without counting.
+        """
+        names = {self._key(key): key for key in keys}
+        now = time.time()
+        found = {}
+        for name, envelope in self._cache.get_many(list(names)).items():
+            expires_at, _ = self._ENVELOPE.unpack_from(envelope)
+            if expires_at > now:
+                found[names[name]] = decode_value(envelope[self._ENVELOPE.size:])
+        return found
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        now = time.time()
+        envelope = self._ENVELOPE.pack(now + ttl, now + ttl + stale_ttl) + encode_value(value)
+        self._cache.set(self._key(key), envelope, timeout=ttl + stale_ttl)
+        self._count('sets')
+
+    def delete(self, key):
+        self._cache.delete(self._key(key))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
 
 # In-memory cache store
-_cache_store = {}
+_cache_store = CacheEngine()
+_in_flight = SingleFlight()
 
-def cache_query(ttl=60):
+
+def set_cache_backend(backend):
+    """
+    Replaces the default backend used by cache_query, e.g. with a
+    SharedMemoryBackend so that all workers on a host share one cache.
+    """
+    global _cache_store
+    _cache_store = backend
+
+
+# ----------------------------------------
+# Table tags
+# ----------------------------------------
+# Each table has a version stored in the backend itself, so every
+# process sharing the backend sees it. Cached results are keyed by the
+# versions of the tables they read; invalidating a table gives it a new
+# version, which orphans every older result at once. Orphans age out
+# through TTL and LRU like any other entry.
+
+_VERSION_TTL = 10 * 365 * 24 * 3600
+_backends_in_use = set()
+
+
+def _version_key(table):
+    return ('__table_version__', table)
+
+
+def _table_versions(store, tables):
+    """
+    Current versions of `tables`, read with one peek_many() call so a
+    cached call costs one extra backend read however many tags it has.
+    """
+    keys = [_version_key(table) for table in tables]
+    found = store.peek_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            # Never restart from an old number: an evicted version must not
+            # bring back results cached under it
+            version = time.time_ns()
+            store.set(key, version, _VERSION_TTL)
+        versions.append(version)
+    return tuple(versions)
+
+
+def invalidate_tables(tables, backend=None):
+    """
+    Invalidates every cached result tagged with any of `tables`, in
+    `backend` or, by default, in the current default backend and every
+    backend cache_query has used. ALL_TABLES invalidates every tagged result.
+    """
+    stores = [backend] if backend is not None else list(_backends_in_use | {_cache_store})
+    for store in stores:
+        for table in tables:
+            store.set(_version_key(table), time.time_ns(), _VERSION_TTL)
+
+
+subscribe(invalidate_tables)
+
+
+def _tables_for_call(tables, args, kwargs):
+    """Explicit tags, or the tables read by any SQL string argument."""
+    if tables is not None:
+        return tables
+    found = set()
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, str):
+            found |= tables_read(value)
+    return sorted(found)
+
+
+# Types whose values compare equal to ints: 1 == True == 1.0 == 1+0j
+_NUMERIC_ALIASES = frozenset((bool, float, complex))
+
+
+def _has_numeric_alias(values):
+    """True if `values`, or a tuple nested in them, holds a bool, float or complex."""
+    types = set(map(type, values))
+    if not _NUMERIC_ALIASES.isdisjoint(types):
+        return True
+    if tuple in types:
+        for value in values:
+            if type(value) is tuple and _has_numeric_alias(value):
+                return True
+    return False
+
+
+def _type_signature(values):
+    """The types of `values`, with nested tuples expanded."""
+    return tuple([_type_signature(v) if type(v) is tuple else type(v) for v in values])
+
+
+def make_cache_key(name, args, kwargs):
+    """
+    Builds the cache key for a call. When every argument is hashable
+    the key is the flat tuple (name, args, kwargs), which costs one
+    tuple hash. If a bool, float or complex argument appears the types
+    are appended, so f(1), f(True) and f(1.0) stay apart. Otherwise the
+    arguments are pickled and digested with SHA-256.
+    """
+    items = tuple(sorted(kwargs.items())) if kwargs else ()
+    key = (name, args, items)
+    try:
+        hash(key)
+    except TypeError:
+        return hashlib.sha256(pickle.dumps(key)).hexdigest()
+    values = args + tuple([value for _, value in items]) if items else args
+    if _has_numeric_alias(values):
+        key += (_type_signature(values),)
+    return key
+
+
+def cache_query(ttl=60, stale_ttl=0, backend=None, tables=None):
     """
     Decorator that caches results of database queries
     to avoid redundant DB calls.
 
     - ttl: time-to-live in seconds (default: 60s)
+    - stale_ttl: for this many seconds after ttl, the expired result is
+      still served while one background call refreshes it
+      (stale-while-revalidate; default: off)
+    - backend: where results are stored (default: the backend set with
+      set_cache_backend, an in-process CacheEngine unless changed)
+    - tables: table name or names the result depends on; by default
+      they are read from the FROM/JOIN clauses of any SQL string
+      argument. Writes committed through transactional to these tables
+      invalidate it.
+
+    Concurrent misses on the same key run the query once and share
+    the result.
     """
+    if isinstance(tables, str):
+        tables = (tables,)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
+            store = _cache_store if backend is None else backend
+            _backends_in_use.add(store)
             # Create a unique cache key based on function name + args
-            key_data = (func.__name__, args, tuple(sorted(kwargs.items())))
-            cache_key = hashlib.sha256(pickle.dumps(key_data)).hexdigest()
+            cache_key = make_cache_key(func.__name__, args, kwargs)
+            tags = _tables_for_call(tables, args, kwargs)
+            if tags:
+                # Tagged results also depend on ALL_TABLES, bumped for
+                # writes whose tables could not be parsed
+                versions = _table_versions(store, (*tags, ALL_TABLES))
+                cache_key = (cache_key, tuple(tags), versions)
+
+            def refresh():
+                result = func(*args, **kwargs)
+                store.set(cache_key, result, ttl, stale_ttl)
+                return result
 
             # Check if result is cached and still valid
-            if cache_key in _cache_store:
-                result, timestamp = _cache_store[cache_key]
-                if time.time() - timestamp < ttl:
-                    print(f"⚡ Cache hit for '{func.__name__}'")
-                    return result
-                else:
-                    # Cache expired
-                    del _cache_store[cache_key]
-
-            # Otherwise, execute the function and cache its result
+            status, result = store.lookup(cache_key)
+            if status is FRESH:
+                print(f"⚡ Cache hit for '{func.__name__}'")
+                return result
+            if status is STALE:
+                print(f"⚡ Stale cache hit for '{func.__name__}' — refreshing in background...")
+                _in_flight.do_in_background(cache_key, refresh)
+                return result
+
+            # Otherwise, execute the function once and cache its result
             print(f"🗄️ Cache miss for '{func.__name__}' — querying database...")
-            result = func(*args, **kwargs)
-            _cache_store[cache_key] = (result, time.time())
-            return result
+            return _in_flight.do(cache_key, refresh)
         return wrapper
     return decorator
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the decorator tasks.
+
+Usage:
+    python3 benchmarks.py with_db_connection 10000
+    python3 benchmarks.py cache_key 100000
+"""
+import contextlib
+import hashlib
+import io
+import pickle
+import sys
+import time
+from functools import wraps
+
+import mysql.connector
+
+from db_pool import connect_args_from_env
+
+with_db_connection = __import__('1-with_db_connection').with_db_connection
+cache_query_module = __import__('4-cache_query')
+
+
+def connect_per_call(func):
+    """The original with_db_connection: one new connection per call."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        connection = mysql.connector.connect(**connect_args_from_env())
+        try:
+            return func(*args, connection=connection, **kwargs)
+        finally:
+            connection.close()
+    return wrapper
+
+
+def _select_one(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1")
+    cursor.fetchall()
+    cursor.close()
+
+
+def bench_with_db_connection(calls=10000):
+    """
+    Time `calls` decorated SELECT 1 calls with connect-per-call and
+    with pooled leasing. Decorator console output is discarded.
+    """
+    variants = {
+        'connect-per-call': connect_per_call(_select_one),
+        'pooled': with_db_connection(_select_one),
+    }
+
+    print(f"{'variant':>18} {'calls':>8} {'seconds':>10} {'us/call':>10}")
+    for name, func in variants.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(calls):
+                func()
+            elapsed = time.perf_counter() - start
+        print(f"{name:>18} {calls:>8} {elapsed:>10.2f} {elapsed * 1e6 / calls:>10.1f}")
+
+
+def _pickled_key(name, args, kwargs):
+    """The original cache_query key: SHA-256 of the pickled call."""
+    key_data = (name, args, tuple(sorted(kwargs.items())))
+    return hashlib.sha256(pickle.dumps(key_data)).hexdigest()
+
+
+def bench_cache_key(calls=100000):
+    """
+    Time building the key alone and full cache hits for a small query
+    string with the pickled SHA-256 key and with the tuple-hash key.
+    No database is needed.
+    """
+    engine = cache_query_module.CacheEngine(reap_interval=0)
+    args = ("SELECT * FROM users WHERE id = %s", (42,))
+    variants = {
+        'pickle+sha256': _pickled_key,
+        'tuple-hash': cache_query_module.make_cache_key,
+    }
+
+    print(f"{'variant':>14} {'calls':>8} {'ns/key':>10} {'ns/hit':>10}")
+    for name, make_key in variants.items():
+        engine.set(make_key('fetch', args, {}), [], 60)
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            make_key('fetch', args, {})
+        key_elapsed = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            engine.get(make_key('fetch', args, {}))
+        elapsed = time.perf_counter_ns() - start
+        print(f"{name:>14} {calls:>8} {key_elapsed / calls:>10.0f} {elapsed / calls:>10.0f}")
+
+
+BENCHMARKS = {
+    'with_db_connection': bench_with_db_connection,
+    'cache_key': bench_cache_key,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: {sys.argv[0]} {{{'|'.join(BENCHMARKS)}}} [args...]")
+        sys.exit(1)
+    name, args = sys.argv[1], [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[name](*args)
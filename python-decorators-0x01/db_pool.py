@@ -0,0 +1 @@
+../db_pool.py
\ No newline at end of file
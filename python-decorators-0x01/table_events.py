@@ -0,0 +1,151 @@
+"""
+Which tables a statement reads or writes, plus a tiny publish/subscribe
+hub for "these tables were written" events. The parsers are memoised
+per SQL string, since the same statements run over and over.
+
+transactional publishes the tables its committed statements wrote;
+cache_query subscribes and invalidates results tagged with them.
+When the tables a write touches cannot be worked out, ALL_TABLES is
+published instead, which invalidates every tagged result.
+"""
+from functools import lru_cache
+import re
+import threading
+
+# Published in place of table names when a write's targets are unknown
+ALL_TABLES = '*'
+
+_NAME = r"`?[A-Za-z0-9_$]+`?(?:\.`?[A-Za-z0-9_$]+`?)?"
+_CLAUSE_END = (
+    r"(?:WHERE|SET|ON|USING|JOIN|INNER|CROSS|STRAIGHT_JOIN|LEFT|RIGHT|NATURAL|OUTER"
+    r"|GROUP|ORDER|HAVING|LIMIT|WINDOW|UNION|FOR|LOCK|INTO|VALUES|SELECT|PARTITION)\b"
+)
+# One table reference, optionally aliased: users, users u, db.users AS u
+_TABLE_REF = _NAME + r"(?:\s+(?:AS\s+)?(?!" + _CLAUSE_END + r")[A-Za-z0-9_$`]+)?"
+# A comma-separated list of table references
+_TABLE_LIST = _TABLE_REF + r"(?:\s*,\s*" + _TABLE_REF + r")*"
+
+_COMMENTS = re.compile(r"/\*.*?\*/|(?:--\s|#)[^\n]*", re.DOTALL)
+_LISTS = re.compile(r"\b(?:FROM|JOIN|USING|STRAIGHT_JOIN)\s+(" + _TABLE_LIST + r")", re.IGNORECASE)
+_FIRST_NAME = re.compile(_NAME)
+_VERB = re.compile(r"\s*([A-Za-z]+)")
+_MODIFIERS = r"(?:\s+(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|QUICK|IGNORE))*"
+_INSERT = re.compile(r"(?:INSERT|REPLACE)" + _MODIFIERS + r"\s+(?:INTO\s+)?(" + _NAME + ")", re.IGNORECASE)
+_UPDATE = re.compile(r"UPDATE" + _MODIFIERS + r"\s+(.*?)\bSET\b", re.IGNORECASE | re.DOTALL)
+# DDL naming one table, then DDL taking a list (RENAME's "a TO b" pairs included)
+_DDL_ONE = re.compile(
+    r"(?:TRUNCATE\s+(?:TABLE\s+)?|ALTER\s+TABLE\s+"
+    r"|CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)(" + _NAME + ")",
+    re.IGNORECASE,
+)
+_DDL_LIST = re.compile(
+    r"(?:DROP\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+EXISTS\s+)?|RENAME\s+TABLE\s+)(.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+_LOAD = re.compile(r"LOAD\s+(?:DATA|XML)\b.*?\bINTO\s+TABLE\s+(" + _NAME + ")", re.IGNORECASE | re.DOTALL)
+
+# Statements that never change table data
+_READ_VERBS = {
+    'SELECT', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN', 'SET', 'USE', 'DO',
+    'BEGIN', 'START', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+}
+
+
+def _normalise(name):
+    # Tag by bare table name so `db.users` and `users` match
+    return name.replace('`', '').split('.')[-1].lower()
+
+
+def _names(table_list):
+    """Table names in a comma-separated list of (aliased) references."""
+    return {
+        _normalise(_FIRST_NAME.match(ref.strip()).group(0))
+        for ref in table_list.split(',') if _FIRST_NAME.match(ref.strip())
+    }
+
+
+def _strip(sql):
+    """`sql` without comments and with any leading WITH ... AS (...) list."""
+    sql = _COMMENTS.sub(' ', sql).strip()
+    if not re.match(r"WITH\b", sql, re.IGNORECASE):
+        return sql
+    depth = 0
+    for match in re.finditer(r"[()]|\b(?:SELECT|INSERT|UPDATE|DELETE|REPLACE)\b", sql, re.IGNORECASE):
+        token = match.group(0)
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0:
+            return sql[match.start():]
+    return sql
+
+
+@lru_cache(maxsize=1024)
+def tables_read(sql):
+    """Tables named after FROM, JOIN or USING in `sql`, including comma lists."""
+    found = set()
+    for table_list in _LISTS.findall(_COMMENTS.sub(' ', sql)):
+        found |= _names(table_list)
+    return frozenset(found)
+
+
+@lru_cache(maxsize=1024)
+def tables_written(sql):
+    """
+    Tables a data-changing statement may write (empty for reads). For
+    multi-table UPDATE and DELETE every referenced table is included,
+    since any of them can be a target.
+    """
+    statement = _strip(sql)
+    verb = _VERB.match(statement)
+    verb = verb.group(1).upper() if verb else ''
+    if verb in ('INSERT', 'REPLACE'):
+        match = _INSERT.match(statement)
+        return frozenset({_normalise(match.group(1))}) if match else frozenset()
+    if verb == 'UPDATE':
+        match = _UPDATE.match(statement)
+        if not match:
+            return frozenset()
+        references = match.group(1)
+        return frozenset(_names(re.split(r"\bJOIN\b|\bON\b", references, flags=re.IGNORECASE)[0])
+                         | tables_read(references))
+    if verb == 'DELETE':
+        return tables_read(statement)
+    if verb == 'LOAD':
+        match = _LOAD.match(statement)
+        return frozenset({_normalise(match.group(1))}) if match else frozenset()
+    match = _DDL_ONE.match(statement)
+    if match:
+        return frozenset({_normalise(match.group(1))})
+    match = _DDL_LIST.match(statement)
+    if match:
+        return frozenset(_names(re.sub(r"\bTO\b", ',', match.group(1), flags=re.IGNORECASE)))
+    return frozenset()
+
+
+@lru_cache(maxsize=1024)
+def is_read_only(sql):
+    """True for statements that cannot change table data (SELECT, SHOW...)."""
+    verb = _VERB.match(_strip(sql))
+    return bool(verb) and verb.group(1).upper() in _READ_VERBS
+
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Calls `callback(tables)` whenever publish_writes() is called."""
+    with _lock:
+        _subscribers.append(callback)
+
+
+def publish_writes(tables):
+    """Announces that `tables` were changed by a committed transaction."""
+    if not tables:
+        return
+    with _lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        callback(frozenset(tables))
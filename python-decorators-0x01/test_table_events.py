@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SQL table parsing in table_events.py, which decides
+which cached results a committed write invalidates.
+"""
+import unittest
+
+from table_events import is_read_only, tables_read, tables_written
+
+
+class TestTablesWritten(unittest.TestCase):
+    """Tests the tables each kind of write statement is tagged with."""
+    def assertWrites(self, sql, tables):
+        self.assertEqual(tables_written(sql), frozenset(tables), sql)
+
+    def test_insert_and_replace(self):
+        self.assertWrites("INSERT INTO users (name) VALUES (%s)", {'users'})
+        self.assertWrites("INSERT IGNORE users VALUES (1)", {'users'})
+        self.assertWrites("REPLACE LOW_PRIORITY INTO `db`.`Users` VALUES (1)", {'users'})
+
+    def test_multi_table_update(self):
+        self.assertWrites("UPDATE users u JOIN orders o ON o.user_id = u.id SET o.total = 0",
+                          {'users', 'orders'})
+        self.assertWrites("UPDATE users, orders SET users.age = 1 WHERE users.id = orders.user_id",
+                          {'users', 'orders'})
+
+    def test_multi_table_delete(self):
+        self.assertWrites("DELETE FROM users WHERE age > 100", {'users'})
+        self.assertWrites("DELETE u FROM users u JOIN orders o ON o.user_id = u.id",
+                          {'users', 'orders'})
+        self.assertWrites("DELETE FROM users, orders USING users JOIN orders",
+                          {'users', 'orders'})
+
+    def test_with_clause(self):
+        written = tables_written(
+            "WITH old AS (SELECT id FROM archive) DELETE FROM users WHERE id IN (SELECT id FROM old)"
+        )
+        self.assertIn('users', written)
+        self.assertNotIn('archive', written)
+
+    def test_comments_ignored(self):
+        self.assertWrites("/* bulk */ INSERT INTO users VALUES (1) -- UPDATE orders SET x = 1",
+                          {'users'})
+
+    def test_ddl(self):
+        self.assertWrites("TRUNCATE TABLE users", {'users'})
+        self.assertWrites("ALTER TABLE users ADD COLUMN age INT", {'users'})
+        self.assertWrites("CREATE TABLE IF NOT EXISTS users (id INT)", {'users'})
+        self.assertWrites("DROP TABLE IF EXISTS users, orders", {'users', 'orders'})
+        self.assertWrites("RENAME TABLE users TO old_users", {'users', 'old_users'})
+
+    def test_load_data(self):
+        self.assertWrites("LOAD DATA LOCAL INFILE 'users.csv' INTO TABLE users", {'users'})
+
+    def test_reads_write_nothing(self):
+        self.assertWrites("SELECT * FROM users", set())
+        self.assertWrites("CALL refresh_users()", set())
+
+
+class TestTablesRead(unittest.TestCase):
+    """Tests the tables a cached query is tagged with."""
+    def test_joins_and_comma_lists(self):
+        self.assertEqual(
+            tables_read("SELECT * FROM users u, orders AS o JOIN items i ON i.id = o.item_id WHERE 1"),
+            {'users', 'orders', 'items'},
+        )
+
+    def test_comments_ignored(self):
+        self.assertEqual(tables_read("SELECT * FROM users -- FROM secrets\n"), {'users'})
+
+
+class TestIsReadOnly(unittest.TestCase):
+    """Tests which statements can never change table data."""
+    def test_reads(self):
+        for sql in ("SELECT 1", "  show tables", "EXPLAIN SELECT * FROM users",
+                    "WITH t AS (SELECT 1) SELECT * FROM t", "SAVEPOINT sp1"):
+            self.assertTrue(is_read_only(sql), sql)
+
+    def test_writes_and_unknown(self):
+        for sql in ("INSERT INTO users VALUES (1)", "CALL refresh_users()",
+                    "WITH t AS (SELECT 1) DELETE FROM users", ""):
+            self.assertFalse(is_read_only(sql), sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
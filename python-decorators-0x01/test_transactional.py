@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the lock-conflict replay in 2-transactional.py.
+A fake connection stands in for MySQL and records which statements
+end up committed.
+"""
+import unittest
+from unittest.mock import patch
+from mysql.connector.errors import DatabaseError, IntegrityError
+
+tx = __import__('2-transactional')
+
+
+def deadlock():
+    return DatabaseError(msg="Deadlock found when trying to get lock", errno=1213)
+
+
+class FakeCursor:
+    """Cursor that forwards statements to its FakeConnection."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, operation, params=None):
+        self.connection.execute(operation)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    Keeps uncommitted statements in `pending` and committed ones in
+    `committed`, with savepoints as markers in `pending`.
+    """
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def statement_cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def execute(self, operation):
+        if operation.startswith("ROLLBACK TO SAVEPOINT "):
+            marker = operation[len("ROLLBACK TO "):]
+            del self.pending[self.pending.index(marker) + 1:]
+        elif not operation.startswith("RELEASE SAVEPOINT "):
+            self.pending.append(operation)
+
+    def commit(self):
+        self.committed += [op for op in self.pending if not op.startswith("SAVEPOINT ")]
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+class TestConflictReplay(unittest.TestCase):
+    """
+    Tests that conflicts which cannot be resolved by replaying raise
+    TransactionConflictError and never commit partial work.
+    """
+    def setUp(self):
+        self.connection = FakeConnection()
+        patches = [
+            patch.object(tx, 'get_connection', lambda *args: self.connection),
+            patch.object(tx.time, 'sleep'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_gave_up_conflict_raises(self):
+        """A function that always deadlocks raises after max_attempts."""
+        @tx.transactional(max_attempts=3)
+        def always_deadlock(connection, cursor):
+            cursor.execute("UPDATE users SET age = 1")
+            raise deadlock()
+
+        with self.assertRaises(tx.TransactionConflictError):
+            always_deadlock()
+        self.assertEqual(self.connection.committed, [])
+        stats = tx.conflict_stats()['always_deadlock']
+        self.assertEqual(stats['conflicts'], 3)
+        self.assertEqual(stats['replays'], 2)
+        self.assertEqual(stats['gave_up'], 1)
+
+    def test_replay_recovers_from_one_conflict(self):
+        """A single deadlock is replayed and the function's result returned."""
+        attempts = []
+
+        @tx.transactional
+        def deadlock_once(connection, cursor):
+            attempts.append(1)
+            cursor.execute("UPDATE users SET age = 2")
+            if len(attempts) == 1:
+                raise deadlock()
+            return 'ok'
+
+        self.assertEqual(deadlock_once(), 'ok')
+        self.assertEqual(self.connection.committed, ["UPDATE users SET age = 2"])
+
+    def test_failed_replay_commits_nothing(self):
+        """A journaled call failing on replay aborts the whole batch."""
+        runs = {'a': 0, 'b': 0}
+
+        @tx.transactional
+        def a(connection, cursor):
+            runs['a'] += 1
+            if runs['a'] > 1:
+                raise IntegrityError(msg="Duplicate entry", errno=1062)
+            cursor.execute("INSERT INTO users VALUES ('a')")
+            return 'a-ok'
+
+        @tx.transactional
+        def b(connection, cursor):
+            runs['b'] += 1
+            cursor.execute("INSERT INTO users VALUES ('b')")
+            if runs['b'] == 1:
+                raise deadlock()
+            return 'b-ok'
+
+        with self.assertRaises(tx.TransactionConflictError):
+            with tx.transaction_batch(flush_size=10):
+                self.assertEqual(a(), 'a-ok')
+                b()
+        self.assertEqual(self.connection.committed, [])
+
+
+class TestWritePublishing(unittest.TestCase):
+    """Tests that committed writes are announced whichever cursor made them."""
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.published = []
+        patches = [
+            patch.object(tx, 'get_connection', lambda *args: self.connection),
+            patch.object(tx, 'publish_writes', self.published.append),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_injected_cursor(self):
+        @tx.transactional
+        def add_user(connection, cursor):
+            cursor.execute("INSERT INTO users VALUES ('a')")
+
+        add_user()
+        self.assertEqual(self.published, [{'users'}])
+
+    def test_cursor_opened_on_connection(self):
+        """Writes through connection.cursor() invalidate too."""
+        @tx.transactional
+        def rename_user(connection, cursor):
+            own = connection.cursor()
+            own.execute("UPDATE users SET name = 'b'")
+            own.close()
+
+        rename_user()
+        self.assertEqual(self.published, [{'users'}])
+
+    def test_nested_call_in_batch(self):
+        @tx.transactional
+        def archive(connection, cursor):
+            connection.cursor().execute("CALL archive_users()")
+
+        with tx.transaction_batch():
+            archive()
+        self.assertEqual(self.published, [{tx.ALL_TABLES}])
+
+
+if __name__ == "__main__":
+    unittest.main()
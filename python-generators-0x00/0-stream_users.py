@@ -1,33 +1,48 @@
-import mysql.connector
 from mysql.connector import Error
+from db_pool import get_connection
 
-def stream_users():
+# Number of rows pulled from the server per round trip
+DEFAULT_PREFETCH = 1000
+
+
+def stream_users(prefetch=DEFAULT_PREFETCH, limit=None):
     """
     Generator function that fetches rows one by one
     from the user_data table using yield.
+
+    The cursor is unbuffered, so rows stay on the server until they
+    are asked for and at most `prefetch` rows sit in client memory.
+    `limit` optionally caps the number of rows streamed.
     """
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password',
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
+        # The pool health-checks connections on checkout
+        connection = get_connection()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        if limit is None:
             cursor.execute("SELECT * FROM user_data")
+        else:
+            cursor.execute("SELECT * FROM user_data LIMIT %s", (int(limit),))
 
-            # single loop — yields each row as it's fetched
-            for row in cursor:
-                yield row
+        # single loop — yields each row of the prefetch window
+        while True:
+            rows = cursor.fetchmany(prefetch)
+            if not rows:
+                break
+            yield from rows
 
     except Error as e:
         print("Error while streaming data:", e)
 
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                # Generator closed early: the pool discards the connection
+                pass
+        if connection is not None:
             connection.close()
 
 
@@ -1,46 +1,91 @@
-import mysql.connector
 from mysql.connector import Error
+from db_pool import get_connection
+from prefetch import read_ahead
 
-def stream_users_in_batches(batch_size):
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+FILTER_OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+
+def compile_query(where=None, columns=None):
+    """
+    Compiles a column projection and a filter spec into a SELECT on
+    user_data. `where` is a list of (column, operator, value) tuples
+    joined with AND; values are passed as parameters, never inlined.
+    Returns (query, params).
+    """
+    columns = columns or USER_COLUMNS
+    for column in columns:
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Unknown column: {column!r}")
+
+    conditions = []
+    params = []
+    for column, operator, value in where or ():
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Unknown column: {column!r}")
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator!r}")
+        conditions.append(f"{column} {operator} %s")
+        params.append(value)
+
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, tuple(params)
+
+
+def stream_users_in_batches(batch_size, where=None, columns=None):
     """
     Generator that fetches rows from user_data table in batches.
     Uses yield to return each batch as a list of user dicts.
+    `where` and `columns` are pushed down into the SQL (see
+    compile_query), so filtered-out rows never leave the server.
     """
+    query, params = compile_query(where, columns)
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password',   # <-- replace with your MySQL password
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM user_data")
-
-            while True:
-                batch = cursor.fetchmany(batch_size)
-                if not batch:
-                    break
-                yield batch  # yield one batch at a time
+        connection = get_connection()
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, params)
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch  # yield one batch at a time
 
     except Error as e:
         print("Error while fetching data in batches:", e)
 
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                # Generator closed early: the pool discards the connection
+                pass
+        if connection is not None:
             connection.close()
 
 
+def prefetch_users_in_batches(batch_size, depth=2, where=None, columns=None):
+    """
+    Same batches as stream_users_in_batches(), but fetched on a
+    background thread at most `depth` batches ahead (see
+    prefetch.read_ahead), so the next fetchmany() runs while the caller
+    processes the current batch.
+    """
+    return read_ahead(stream_users_in_batches(batch_size, where, columns), depth)
+
+
 def batch_processing(batch_size):
     """
     Processes each batch yielded from stream_users_in_batches()
     and filters users over age 25.
     """
-    for batch in stream_users_in_batches(batch_size):     # Loop 1
-        filtered_users = [user for user in batch if int(user['age']) > 25]  # Loop 2 (list comprehension)
-        for user in filtered_users:  # Loop 3
+    for batch in stream_users_in_batches(batch_size, where=[('age', '>', 25)]):  # Loop 1
+        for user in batch:  # Loop 2 (the age filter runs in SQL)
             yield user
 
 
@@ -1,32 +1,51 @@
-import mysql.connector
+import base64
 from mysql.connector import Error
+from db_pool import get_connection
 
-def paginate_users(page_size, offset):
+PAGE_QUERY = "SELECT * FROM user_data ORDER BY user_id LIMIT %s OFFSET %s"
+FIRST_SEEK_QUERY = "SELECT * FROM user_data ORDER BY user_id LIMIT %s"
+SEEK_QUERY = "SELECT * FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s"
+
+
+def connect_to_prodev():
+    """
+    Leases a connection to the ALX_prodev database from the shared pool.
+    """
+    return get_connection()
+
+
+def open_page_cursor(connection):
+    """
+    Returns a prepared-statement cursor for page queries. The cursor
+    prepares each query text once and re-executes it with new
+    parameters, so repeated pages skip the server-side parse.
+    """
+    return connection.cursor(prepared=True, dictionary=True)
+
+
+def paginate_users(page_size, offset, cursor=None):
     """
     Fetches a single page of users from user_data table starting at a given offset.
+    Pass a cursor from open_page_cursor() to reuse its connection;
+    otherwise a connection is opened for this page only.
     """
+    connection = None
+    page_cursor = cursor
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password',   # <-- replace with your MySQL password
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}"
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return rows
+        if page_cursor is None:
+            connection = connect_to_prodev()
+            page_cursor = connection.cursor(dictionary=True)
+        page_cursor.execute(PAGE_QUERY, (page_size, offset))
+        return page_cursor.fetchall()
 
     except Error as e:
         print("Error fetching page:", e)
         return []
 
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if connection is not None:
+            if page_cursor is not None:
+                page_cursor.close()
             connection.close()
 
 
@@ -35,14 +54,108 @@ def lazy_paginate(page_size):
     Generator that lazily fetches pages of users one by one.
     Only loads the next page when needed (lazy loading).
     Must use only one loop.
+    All pages are fetched over one connection with one prepared statement.
+    """
+    try:
+        connection = connect_to_prodev()
+    except Error as e:
+        print("Error fetching page:", e)
+        return
+
+    cursor = open_page_cursor(connection)
+    try:
+        offset = 0
+        while True:
+            page = paginate_users(page_size, offset, cursor)
+            if not page:
+                break
+            yield page
+            offset += page_size  # move to the next page
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# ----------------------------------------
+# Keyset (seek) pagination
+# ----------------------------------------
+def encode_page_token(page):
+    """
+    Returns an opaque token that resumes pagination after the last
+    row of `page`, or None if the page is empty.
+    """
+    if not page:
+        return None
+    last_id = page[-1]['user_id']
+    return base64.urlsafe_b64encode(last_id.encode()).decode()
+
+
+def decode_page_token(token):
+    """
+    Returns the user_id a page token points after (None starts from the beginning).
     """
-    offset = 0
-    while True:
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        yield page
-        offset += page_size  # move to the next page
+    if token is None:
+        return None
+    try:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid page token: {token!r}")
+
+
+def seek_users(page_size, after_id=None, cursor=None):
+    """
+    Fetches the page of users whose user_id follows `after_id`.
+    Seeks on the primary key, so every page costs the same
+    no matter how deep into the table it is.
+    Pass a cursor from open_page_cursor() to reuse its connection.
+    """
+    connection = None
+    page_cursor = cursor
+    try:
+        if page_cursor is None:
+            connection = connect_to_prodev()
+            page_cursor = connection.cursor(dictionary=True)
+        if after_id is None:
+            page_cursor.execute(FIRST_SEEK_QUERY, (page_size,))
+        else:
+            page_cursor.execute(SEEK_QUERY, (after_id, page_size))
+        return page_cursor.fetchall()
+
+    except Error as e:
+        print("Error fetching page:", e)
+        return []
+
+    finally:
+        if connection is not None:
+            if page_cursor is not None:
+                page_cursor.close()
+            connection.close()
+
+
+def keyset_paginate(page_size, token=None):
+    """
+    Generator that yields the same pages as lazy_paginate(), resuming
+    from the last user_id returned instead of counting an OFFSET.
+    Pass a token from encode_page_token() to resume an earlier walk.
+    """
+    after_id = decode_page_token(token)
+    try:
+        connection = connect_to_prodev()
+    except Error as e:
+        print("Error fetching page:", e)
+        return
+
+    cursor = open_page_cursor(connection)
+    try:
+        while True:
+            page = seek_users(page_size, after_id, cursor)
+            if not page:
+                break
+            yield page
+            after_id = page[-1]['user_id']
+    finally:
+        cursor.close()
+        connection.close()
 
 
 # Example usage:
@@ -1,50 +1,259 @@
-import mysql.connector
+import itertools
+import math
+import operator
+from array import array
+from collections import Counter
 from mysql.connector import Error
+from db_pool import get_connection
+
+AGGREGATES = ('AVG', 'COUNT', 'MIN', 'MAX')
+
+# Rows per fetchmany() in columnar mode
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def connect_to_prodev():
+    """
+    Leases a connection to the ALX_prodev database from the shared pool.
+    """
+    return get_connection()
 
 
 def stream_user_ages():
     """
     Generator that streams user ages one by one from user_data table.
     """
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password',   # <-- replace with your MySQL password
-            database='ALX_prodev'
-        )
+        connection = connect_to_prodev()
+        cursor = connection.cursor()
+        cursor.execute("SELECT age FROM user_data")
+
+        # Single loop to yield each user's age
+        for (age,) in cursor:
+            yield float(age)
 
-        if connection.is_connected():
-            cursor = connection.cursor()
-            cursor.execute("SELECT age FROM user_data")
+    except Error as e:
+        print("Error streaming user ages:", e)
 
-            # Single loop to yield each user's age
-            for (age,) in cursor:
-                yield float(age)
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                # Generator closed early: the pool discards the connection
+                pass
+        if connection is not None:
+            connection.close()
+
+
+def stream_user_age_buffers(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Columnar variant of stream_user_ages(): yields one array('d') of
+    ages per fetchmany() chunk instead of one float per row. The
+    server casts age to DOUBLE, and the buffers support the buffer
+    protocol, so numpy.frombuffer() can wrap them without copying.
+    """
+    connection = None
+    cursor = None
+    first = operator.itemgetter(0)
+    try:
+        connection = connect_to_prodev()
+        cursor = connection.cursor()
+        cursor.execute("SELECT CAST(age AS DOUBLE) FROM user_data")
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield array('d', map(first, rows))
 
     except Error as e:
         print("Error streaming user ages:", e)
 
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                # Generator closed early: the pool discards the connection
+                pass
+        if connection is not None:
             connection.close()
 
 
-def calculate_average_age():
+def aggregate_ages(functions=AGGREGATES):
+    """
+    Computes aggregates of the age column in the database, e.g.
+    aggregate_ages(('AVG', 'COUNT')) -> {'AVG': 37.5, 'COUNT': 1000}.
+    Only one row crosses the wire. Raises mysql.connector.Error if
+    the query cannot run, so callers can fall back to streaming.
+    """
+    for function in functions:
+        if function not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: {function!r}")
+
+    connection = connect_to_prodev()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT " + ", ".join(f"{function}(age)" for function in functions)
+            + " FROM user_data"
+        )
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+
+    return {
+        function: (None if value is None else
+                   int(value) if function == 'COUNT' else float(value))
+        for function, value in zip(functions, row)
+    }
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (in the style of DDSketch). Every
+    quantile is within `relative_accuracy` of the true value, and
+    memory grows with the log of the value range, not the row count.
+    Only non-negative values are supported.
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value < 0:
+            raise ValueError("QuantileSketch only accepts non-negative values")
+        if value == 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += count
+
+    def add_buffer(self, values):
+        """Adds a whole buffer, bucketing each distinct value once."""
+        for value, count in Counter(values).items():
+            self.add(value, count)
+
+    def quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class StreamingStats:
+    """
+    Single-pass statistics accumulator. Mean and variance use
+    Welford's algorithm, which stays numerically stable over long
+    streams; percentiles come from a QuantileSketch.
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def add_buffer(self, values):
+        """
+        Adds a whole buffer of values. The buffer's mean, then its
+        squared deviations from that mean (a second pass, which avoids
+        the cancellation of sum(x*x) - n*mean**2), are reduced by
+        C-level builtins and merged with Chan's parallel update instead
+        of one add() per value.
+        """
+        n = len(values)
+        if n == 0:
+            return
+        chunk_mean = math.fsum(values) / n
+        deviations = array('d', map(operator.sub, values, itertools.repeat(chunk_mean)))
+        chunk_m2 = math.fsum(map(operator.mul, deviations, deviations))
+
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        chunk_min, chunk_max = min(values), max(values)
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+        self.sketch.add_buffer(values)
+
+    @property
+    def variance(self):
+        """Population variance."""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    def percentile(self, p):
+        """Approximate p-th percentile (0-100)."""
+        return self.sketch.quantile(p / 100)
+
+
+def calculate_average_age(pushdown=True, columnar=True):
     """
     Consumes the generator to calculate the average age
     without loading all data into memory.
+    With `pushdown` the average is computed by the database and the
+    stream is only used if that query fails. With `columnar` the
+    stream is reduced a buffer at a time rather than a row at a time.
     """
-    total = 0
-    count = 0
+    avg_age = None
+    if pushdown:
+        try:
+            avg_age = aggregate_ages(('AVG',))['AVG']
+        except Error as e:
+            print("Aggregate query failed, streaming instead:", e)
 
-    # Second (and last) loop
-    for age in stream_user_ages():
-        total += age
-        count += 1
+    if avg_age is None:
+        # The average needs only a sum and a count; StreamingStats is
+        # for callers that want the full statistics
+        count = 0
+        if columnar:
+            sums = []
+            for ages in stream_user_age_buffers():
+                sums.append(math.fsum(ages))
+                count += len(ages)
+            total = math.fsum(sums)
+        else:
+            total = 0.0
+            # Second (and last) loop
+            for age in stream_user_ages():
+                total += age
+                count += 1
+        avg_age = total / count if count else 0.0
 
-    avg_age = total / count if count > 0 else 0
     print(f"Average age of users: {avg_age:.2f}")
 
 
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the generator tasks.
+
+Each measurement runs in a fresh child process so that peak RSS
+(ru_maxrss) is not polluted by earlier runs.
+
+Usage:
+    python3 benchmarks.py stream_users 10000 100000 1000000
+    python3 benchmarks.py paginate 0 10000 100000 500000
+    python3 benchmarks.py pushdown 1000
+    python3 benchmarks.py prefetch 100 1000
+"""
+import hashlib
+import multiprocessing
+import resource
+import sys
+import time
+
+stream_users = __import__('0-stream_users').stream_users
+batch_module = __import__('1-batch_processing')
+lazy_paginate_module = __import__('2-lazy_paginate')
+
+
+def _peak_rss_kb():
+    """Return the peak resident set size of this process in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _stream_users_worker(rows, prefetch, queue):
+    start = time.perf_counter()
+    count = 0
+    for _ in stream_users(prefetch=prefetch, limit=rows):
+        count += 1
+    queue.put((count, time.perf_counter() - start, _peak_rss_kb()))
+
+
+def _run_isolated(target, *args):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def bench_stream_users(row_counts=(1000, 10000, 100000), prefetch=1000):
+    """
+    Stream increasing numbers of rows and report peak RSS.
+    With the unbuffered cursor the RSS column should stay flat.
+    """
+    print(f"{'rows':>12} {'seconds':>10} {'peak RSS (KiB)':>16}")
+    for rows in row_counts:
+        count, elapsed, rss = _run_isolated(_stream_users_worker, rows, prefetch)
+        print(f"{count:>12} {elapsed:>10.2f} {rss:>16}")
+
+
+def bench_paginate(offsets=(0, 1000, 10000, 100000), page_size=100, repeat=5):
+    """
+    Time a single page at increasing depths with LIMIT/OFFSET, with
+    keyset seeking, and with keyset seeking on a reused connection.
+    Keyset latency should stay flat.
+    """
+    paginate_users = lazy_paginate_module.paginate_users
+    seek_users = lazy_paginate_module.seek_users
+
+    connection = lazy_paginate_module.connect_to_prodev()
+    cursor = lazy_paginate_module.open_page_cursor(connection)
+
+    print(f"{'offset':>10} {'OFFSET ms':>10} {'keyset ms':>10} {'reused ms':>10}")
+    for offset in offsets:
+        # Find the key that starts the page at this depth (not timed)
+        previous = paginate_users(1, offset - 1) if offset else []
+        after_id = previous[0]['user_id'] if previous else None
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            paginate_users(page_size, offset)
+        offset_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            seek_users(page_size, after_id)
+        keyset_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        # Keyset page on a held connection with a prepared statement
+        start = time.perf_counter()
+        for _ in range(repeat):
+            seek_users(page_size, after_id, cursor)
+        reused_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        print(f"{offset:>10} {offset_ms:>10.2f} {keyset_ms:>10.2f} {reused_ms:>10.2f}")
+
+    cursor.close()
+    connection.close()
+
+
+def _server_bytes_sent(connection):
+    """Return the server's global Bytes_sent counter."""
+    cursor = connection.cursor()
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Bytes_sent'")
+    value = int(cursor.fetchone()[1])
+    cursor.close()
+    return value
+
+
+def bench_pushdown(batch_sizes=(1000,)):
+    """
+    Compare filtering age > 25 in Python against pushing the filter
+    and a column projection into SQL. Bytes are read from the server's
+    global Bytes_sent counter, so run this on an otherwise idle server.
+    """
+    stream_users_in_batches = batch_module.stream_users_in_batches
+    variants = {
+        'python filter': lambda size: (
+            user for batch in stream_users_in_batches(size)
+            for user in batch if int(user['age']) > 25
+        ),
+        'pushdown': lambda size: (
+            user for batch in stream_users_in_batches(size, where=[('age', '>', 25)])
+            for user in batch
+        ),
+        'pushdown+proj': lambda size: (
+            user for batch in stream_users_in_batches(
+                size, where=[('age', '>', 25)], columns=('user_id', 'age'))
+            for user in batch
+        ),
+    }
+    monitor = lazy_paginate_module.connect_to_prodev()
+
+    print(f"{'batch':>8} {'variant':>14} {'rows':>10} {'seconds':>10} {'bytes':>14}")
+    for size in batch_sizes:
+        for name, run in variants.items():
+            before = _server_bytes_sent(monitor)
+            start = time.perf_counter()
+            rows = sum(1 for _ in run(size))
+            elapsed = time.perf_counter() - start
+            sent = _server_bytes_sent(monitor) - before
+            print(f"{size:>8} {name:>14} {rows:>10} {elapsed:>10.2f} {sent:>14}")
+
+    monitor.close()
+
+
+def _cpu_heavy(user, rounds=200):
+    digest = repr(user).encode()
+    for _ in range(rounds):
+        digest = hashlib.sha256(digest).digest()
+    return digest
+
+
+def bench_prefetch(batch_sizes=(100, 1000), depth=2):
+    """
+    Run a CPU-heavy consumer over every user, fetching batches inline
+    and on a background prefetch thread. With prefetching the fetch
+    time hides behind the consumer's work.
+    """
+    variants = {
+        'inline': lambda size: batch_module.stream_users_in_batches(size),
+        'prefetch': lambda size: batch_module.prefetch_users_in_batches(size, depth),
+    }
+
+    print(f"{'batch':>8} {'variant':>10} {'rows':>10} {'seconds':>10}")
+    for size in batch_sizes:
+        for name, run in variants.items():
+            start = time.perf_counter()
+            rows = 0
+            for batch in run(size):
+                for user in batch:
+                    _cpu_heavy(user)
+                rows += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>8} {name:>10} {rows:>10} {elapsed:>10.2f}")
+
+
+BENCHMARKS = {
+    'stream_users': bench_stream_users,
+    'paginate': bench_paginate,
+    'pushdown': bench_pushdown,
+    'prefetch': bench_prefetch,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: {sys.argv[0]} {{{'|'.join(BENCHMARKS)}}} [args...]")
+        sys.exit(1)
+    name, args = sys.argv[1], [int(arg) for arg in sys.argv[2:]]
+    if args:
+        BENCHMARKS[name](args)
+    else:
+        BENCHMARKS[name]()
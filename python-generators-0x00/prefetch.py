@@ -0,0 +1,68 @@
+"""
+Bounded read-ahead shared by the generator tasks: seed.py overlaps CSV
+parsing with inserts and 1-batch_processing.py overlaps fetchmany()
+with the caller's work on the previous batch.
+"""
+import queue
+import threading
+
+
+class _Failure:
+    """Carries an exception raised by the source to the consumer."""
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_ahead(items, depth=2):
+    """
+    Generator that pulls `items` on a background thread into a queue
+    of at most `depth` items, so producing the next item overlaps with
+    the caller's work on the current one. The thread blocks when the
+    queue is full (back-pressure). Closing this generator early stops
+    the thread and closes `items` if it is a generator, which releases
+    whatever it holds (e.g. a pooled connection). Anything the source
+    raises, KeyboardInterrupt included, is re-raised in the caller.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Wait for room, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            # Must reach the consumer, or it would wait on get() forever
+            put(_Failure(e))
+        finally:
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if type(item) is _Failure:
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
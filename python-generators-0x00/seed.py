@@ -1,18 +1,27 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
+from db_pool import connect_args_from_env, get_connection
+from prefetch import read_ahead
+import argparse
+import multiprocessing
+import os
+import queue
 import uuid
 import csv
+import sys
 
 # ----------------------------------------
 # 1. Connect to MySQL Server (no database yet)
 # ----------------------------------------
 def connect_db():
+    """
+    Connects to the server the pool uses (the MYSQL_* settings), without
+    selecting a database, since it may not exist yet.
+    """
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password'   # <-- replace with your MySQL password
-        )
+        settings = connect_args_from_env()
+        del settings['database']
+        connection = mysql.connector.connect(**settings)
         if connection.is_connected():
             print("Connected to MySQL server")
             return connection
@@ -25,25 +34,30 @@ def connect_db():
 # 2. Create database if it doesn’t exist
 # ----------------------------------------
 def create_database(connection):
+    database = connect_args_from_env()['database']
     try:
         cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
-        print("Database 'ALX_prodev' ready.")
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        print(f"Database '{database}' ready.")
     except Error as e:
         print("Error creating database:", e)
 
 
 # ----------------------------------------
-# 3. Connect directly to ALX_prodev
+# 3. Connect to ALX_prodev
 # ----------------------------------------
-def connect_to_prodev():
+def connect_to_prodev(allow_local_infile=False):
+    """
+    Leases a connection from the shared pool. LOAD DATA LOCAL needs a
+    connection opened with allow_local_infile, so that one is direct.
+    """
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='alx',
-            password='password',  # <-- replace with your MySQL password
-            database='ALX_prodev'
-        )
+        if allow_local_infile:
+            connection = mysql.connector.connect(
+                allow_local_infile=True, **connect_args_from_env()
+            )
+        else:
+            connection = get_connection()
         if connection.is_connected():
             print("Connected to ALX_prodev database")
             return connection
@@ -62,7 +76,9 @@ def create_table(connection):
         name VARCHAR(255) NOT NULL,
         email VARCHAR(255) NOT NULL,
         age DECIMAL(3,0) NOT NULL,
-        INDEX (user_id)
+        INDEX (user_id),
+        UNIQUE INDEX idx_user_data_email (email),
+        INDEX idx_user_data_age (age)
     )
     """
     try:
@@ -74,6 +90,46 @@ def create_table(connection):
         print("Error creating table:", e)
 
 
+USER_DATA_INDEXES = (
+    "ALTER TABLE user_data ADD UNIQUE INDEX idx_user_data_email (email)",
+    "ALTER TABLE user_data ADD INDEX idx_user_data_age (age)",
+)
+
+
+def create_indexes(connection):
+    """
+    Adds the indexes to a user_data table created before they were
+    part of the schema. Bulk inserts rely on the unique email index to
+    skip duplicates; age filters pushed down by batch_processing use
+    the age index. Returns whether the unique email index is in place
+    (adding it fails if the table already holds duplicate emails).
+    """
+    cursor = connection.cursor()
+    for statement in USER_DATA_INDEXES:
+        try:
+            cursor.execute(statement)
+        except Error as e:
+            if e.errno != errorcode.ER_DUP_KEYNAME:
+                print("Error creating index:", e)
+    cursor.close()
+    if not has_unique_email_index(connection):
+        print("Error: user_data has no unique index on email.")
+        return False
+    print("Indexes ready.")
+    return True
+
+
+def has_unique_email_index(connection):
+    """True if user_data has a single-column unique index on email."""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SHOW INDEX FROM user_data WHERE Non_unique = 0")
+    columns = {}
+    for index in cursor.fetchall():
+        columns.setdefault(index['Key_name'], []).append(index['Column_name'])
+    cursor.close()
+    return ['email'] in columns.values()
+
+
 # ----------------------------------------
 # 5. Insert CSV data (if not already present)
 # ----------------------------------------
@@ -103,6 +159,99 @@ def insert_data(connection, data):
         print("Error inserting data:", e)
 
 
+# ----------------------------------------
+# 5b. Bulk insert CSV data in batches
+# ----------------------------------------
+BULK_INSERT_QUERY = """
+INSERT INTO user_data (user_id, name, email, age)
+VALUES (%s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE user_id = user_id
+"""
+
+
+def print_progress(processed, total=None):
+    if total:
+        print(f"\rProcessed {processed}/{total} rows", end="", file=sys.stderr)
+    else:
+        print(f"\rProcessed {processed} rows", end="", file=sys.stderr)
+
+
+def insert_chunks(connection, chunks, total=None, progress=print_progress):
+    """
+    Inserts each chunk (a list of CSV row dicts) with one executemany(),
+    which the connector rewrites into one multi-row INSERT. The unique
+    email index turns duplicates into no-ops, so there is no per-row
+    email lookup. `progress(processed, total)` is called after every
+    committed chunk with the number of CSV rows sent so far.
+
+    Returns the number of rows actually inserted; duplicates are not
+    counted. Raises Error if a chunk fails (earlier chunks stay committed).
+    """
+    processed = 0
+    inserted = 0
+    cursor = connection.cursor()
+    try:
+        for chunk in chunks:
+            cursor.executemany(BULK_INSERT_QUERY, [
+                (str(uuid.uuid4()), row['name'], row['email'], row['age'])
+                for row in chunk
+            ])
+            connection.commit()
+            processed += len(chunk)
+            # Affected rows: 1 per new row, 0 per duplicate left unchanged
+            inserted += cursor.rowcount
+            if progress:
+                progress(processed, total)
+    finally:
+        cursor.close()
+    return inserted
+
+
+def bulk_insert_data(connection, data, batch_size=1000, progress=print_progress):
+    """
+    Inserts rows `batch_size` at a time (see insert_chunks).
+    Returns the number of new rows; raises Error on failure.
+    """
+    total = len(data) if hasattr(data, '__len__') else None
+    inserted = insert_chunks(connection, chunked(data, batch_size), total, progress)
+    if progress:
+        print(file=sys.stderr)
+    print(f"Data inserted successfully! {inserted} new rows.")
+    return inserted
+
+
+# ----------------------------------------
+# 5c. LOAD DATA LOCAL INFILE fast path
+# ----------------------------------------
+LOAD_DATA_QUERY = """
+LOAD DATA LOCAL INFILE %s
+IGNORE INTO TABLE user_data
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+LINES TERMINATED BY '\\n'
+IGNORE 1 LINES
+(name, email, age)
+SET user_id = UUID()
+"""
+
+
+def load_data_infile(connection, file_path):
+    """
+    Streams the CSV file to the server in a single LOAD DATA statement.
+    The connection must be opened with allow_local_infile=True and the
+    server must have local_infile enabled. Duplicate emails are skipped.
+    Returns the number of new rows; raises Error on failure.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(LOAD_DATA_QUERY, (file_path,))
+        connection.commit()
+        loaded = cursor.rowcount
+    finally:
+        cursor.close()
+    print(f"Loaded {loaded} new rows from {file_path}.")
+    return loaded
+
+
 # ----------------------------------------
 # 6. Read CSV and seed the DB
 # ----------------------------------------
@@ -113,18 +262,225 @@ def seed_from_csv(file_path):
         return data
 
 
+def chunked(rows, chunk_size):
+    """
+    Groups any iterable of rows into lists of at most `chunk_size`.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean_row(row):
+    """
+    Validates a CSV row and converts its age to int.
+    Returns None for rows that cannot be inserted.
+    """
+    try:
+        age = int(row['age'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not row.get('name') or not row.get('email') or not 0 <= age <= 999:
+        return None
+    return {'name': row['name'], 'email': row['email'], 'age': age}
+
+
+def clean_chunks(reader, chunk_size, label):
+    """
+    Yields lists of at most `chunk_size` validated rows from a DictReader.
+    """
+    skipped = 0
+    for chunk in chunked(map(clean_row, reader), chunk_size):
+        rows = [row for row in chunk if row is not None]
+        skipped += len(chunk) - len(rows)
+        if rows:
+            yield rows
+    if skipped:
+        print(f"Skipped {skipped} invalid rows in {label}.")
+
+
+def stream_csv_chunks(file_path, chunk_size=1000):
+    """
+    Generator that reads the CSV lazily and yields lists of at most
+    `chunk_size` validated rows, so memory is bounded by the chunk
+    size rather than the file size. Invalid rows are skipped.
+    """
+    with open(file_path, 'r', newline='') as csv_file:
+        yield from clean_chunks(csv.DictReader(csv_file), chunk_size, file_path)
+
+
+# ----------------------------------------
+# 6b. Parallel seeding over byte-range shards
+# ----------------------------------------
+def csv_shards(file_path, workers):
+    """
+    Splits the data section of the CSV (everything after the header)
+    into `workers` byte ranges. Returns (fieldnames, [(start, end), ...]).
+    Assumes one record per line, i.e. no quoted newlines.
+    """
+    with open(file_path, 'rb') as csv_file:
+        header = csv_file.readline().decode()
+        data_start = csv_file.tell()
+    fieldnames = next(csv.reader([header]))
+    size = os.path.getsize(file_path)
+    step = max(1, -(-(size - data_start) // workers))
+    shards = [
+        (start, min(start + step, size))
+        for start in range(data_start, size, step)
+    ]
+    return fieldnames, shards
+
+
+def read_shard_lines(file_path, start, end):
+    """
+    Generator over the decoded lines that start inside [start, end).
+    A line crossing `end` belongs to this shard; a line crossing
+    `start` belongs to the previous one.
+    """
+    with open(file_path, 'rb') as csv_file:
+        csv_file.seek(start - 1)
+        csv_file.readline()  # finish the line the previous shard owns
+        while csv_file.tell() < end:
+            line = csv_file.readline()
+            if not line:
+                break
+            yield line.decode()
+
+
+def seed_shard(file_path, start, end, fieldnames, batch_size, progress_queue):
+    """
+    Worker process: parses one byte range and inserts it on its own
+    connection. Duplicate emails across shards are resolved by the
+    unique email index, so shards need no coordination. Each committed
+    chunk's row count is sent to the parent through `progress_queue`,
+    followed by ('inserted', new rows) when the shard is done. A shard
+    that fails exits with status 1.
+    """
+    label = f"{file_path}[{start}:{end}]"
+    connection = connect_to_prodev()
+    if connection is None:
+        sys.exit(1)
+    reported = 0
+
+    def report(processed, total=None):
+        nonlocal reported
+        progress_queue.put(processed - reported)
+        reported = processed
+
+    reader = csv.DictReader(read_shard_lines(file_path, start, end), fieldnames=fieldnames)
+    try:
+        inserted = insert_chunks(connection, read_ahead(clean_chunks(reader, batch_size, label)),
+                                 progress=report)
+    except Error as e:
+        print(f"Error inserting shard {label}:", e)
+        sys.exit(1)
+    finally:
+        connection.close()
+    progress_queue.put(('inserted', inserted))
+
+
+def parallel_seed(file_path, workers, batch_size=1000, progress=print_progress):
+    """
+    Seeds the CSV with `workers` processes, one byte-range shard and
+    one connection each. Progress is aggregated in this process.
+    Returns the number of new rows; raises RuntimeError if any worker
+    failed (shards that finished stay committed).
+    """
+    fieldnames, shards = csv_shards(file_path, workers)
+    progress_queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=seed_shard,
+            args=(file_path, start, end, fieldnames, batch_size, progress_queue)
+        )
+        for start, end in shards
+    ]
+    for process in processes:
+        process.start()
+
+    processed = 0
+    inserted = 0
+    while any(process.is_alive() for process in processes) or not progress_queue.empty():
+        try:
+            message = progress_queue.get(timeout=0.2)
+        except queue.Empty:
+            continue
+        if isinstance(message, tuple):
+            inserted += message[1]
+            continue
+        processed += message
+        if progress:
+            progress(processed)
+    for process in processes:
+        process.join()
+
+    failed = [process for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(processes)} seeding workers failed")
+    return inserted
+
+
 # ----------------------------------------
 # 7. Run all setup steps
 # ----------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the ALX_prodev database.")
+    parser.add_argument('csv_file', nargs='?', default='user_data.csv')
+    parser.add_argument('--mode', choices=('row', 'bulk', 'load-data'), default='bulk',
+                        help="row: one lookup and insert per row; bulk: batched "
+                             "multi-row inserts; load-data: LOAD DATA LOCAL INFILE")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="bulk mode only: seed byte-range shards in N processes")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.mode != 'bulk':
+        parser.error(f"--workers is only supported with --mode bulk, not --mode {args.mode}")
+    return args
+
+
 if __name__ == "__main__":
+    args = parse_args()
+
     server_conn = connect_db()
     if server_conn:
         create_database(server_conn)
         server_conn.close()
 
-    db_conn = connect_to_prodev()
+    db_conn = connect_to_prodev(allow_local_infile=args.mode == 'load-data')
     if db_conn:
         create_table(db_conn)
-        data = seed_from_csv('user_data.csv')
-        insert_data(db_conn, data)
-        db_conn.close()
+        if not create_indexes(db_conn) and args.mode != 'row':
+            # Without it, bulk and load-data modes would insert duplicate emails
+            print(f"Aborting {args.mode} seeding: remove duplicate emails or use --mode row.")
+            db_conn.close()
+            sys.exit(1)
+        try:
+            if args.mode == 'load-data':
+                load_data_infile(db_conn, args.csv_file)
+            elif args.mode == 'bulk' and args.workers > 1:
+                inserted = parallel_seed(args.csv_file, args.workers, args.batch_size)
+                print(file=sys.stderr)
+                print(f"Data inserted successfully! {inserted} new rows.")
+            elif args.mode == 'bulk':
+                chunks = stream_csv_chunks(args.csv_file, args.batch_size)
+                inserted = insert_chunks(db_conn, read_ahead(chunks))
+                print(file=sys.stderr)
+                print(f"Data inserted successfully! {inserted} new rows.")
+            else:
+                data = seed_from_csv(args.csv_file)
+                insert_data(db_conn, data)
+        except (Error, RuntimeError) as e:
+            print(file=sys.stderr)
+            print("Seeding failed:", e)
+            sys.exit(1)
+        finally:
+            db_conn.close()
+    else:
+        sys.exit(1)
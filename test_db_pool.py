@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the prepared statement cache in db_pool.py. A fake
+connection stands in for MySQL and records what reaches the server.
+"""
+import unittest
+from unittest.mock import patch
+from mysql.connector import Error
+
+from db_pool import ER_UNSUPPORTED_PS, ConnectionPool
+
+
+class FakeCursor:
+    """Plain or prepared cursor; prepared ones PREPARE on first execute."""
+    def __init__(self, connection, prepared):
+        self.connection = connection
+        self.prepared = prepared
+        self.statement = None
+        self.closed = False
+        self.rowcount = -1
+        self.column_names = ()
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if self.prepared and operation is not self.statement:
+            self.connection.prepares.append(operation)
+            if operation in self.connection.unpreparable:
+                raise Error(msg="This command is not supported", errno=ER_UNSUPPORTED_PS)
+            self.statement = operation
+        if 'broken' in operation:
+            raise Error(msg="You have an error in your SQL syntax", errno=1064)
+        self.connection.executed.append((operation, self.prepared, args, kwargs))
+        self.rowcount = 1
+
+    def executemany(self, operation, seq_params):
+        self.connection.executed.append((operation, self.prepared, (), {}))
+
+    def callproc(self, procname, args=()):
+        self.connection.executed.append((procname, self.prepared, args, {}))
+        return args
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepares = []
+        self.executed = []
+        self.cursors = []
+        self.unpreparable = set()
+        self.unread_result = False
+        self.in_transaction = False
+
+    def cursor(self, dictionary=False, prepared=False):
+        cursor = FakeCursor(self, prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class StatementCacheTestCase(unittest.TestCase):
+    capacity = 2
+
+    def setUp(self):
+        self.raw = FakeConnection()
+        self.pool = ConnectionPool(min_size=0, max_size=1, statement_cache_size=self.capacity)
+        patcher = patch.object(self.pool, '_connect', lambda: self.raw)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection = self.pool.acquire()
+        self.addCleanup(self.connection.close)
+
+    def run_query(self, query, params=(1,)):
+        cursor = self.connection.statement_cursor()
+        try:
+            cursor.execute(query, params)
+        finally:
+            cursor.close()
+
+
+class TestStatementCache(StatementCacheTestCase):
+    """Tests insert, reuse and eviction of cached prepared statements."""
+    def test_repeated_query_prepares_once(self):
+        query = "SELECT * FROM users WHERE id = %s"
+        for _ in range(3):
+            self.run_query(query)
+        self.assertEqual(self.raw.prepares, [query])
+        stats = self.pool.stats()
+        self.assertEqual((stats['statement_hits'], stats['statement_misses']), (2, 1))
+
+    def test_least_recently_used_is_evicted_and_closed(self):
+        self.run_query("SELECT 1 FROM a WHERE x = %s")
+        self.run_query("SELECT 1 FROM b WHERE x = %s")
+        self.run_query("SELECT 1 FROM a WHERE x = %s")
+        self.run_query("SELECT 1 FROM c WHERE x = %s")  # evicts b
+        evicted = [c for c in self.raw.cursors if c.statement == "SELECT 1 FROM b WHERE x = %s"]
+        self.run_query("SELECT 1 FROM a WHERE x = %s")  # evicted cursors close on lookup
+        self.assertTrue(evicted[0].closed)
+        self.assertEqual(self.pool.stats()['statement_evictions'], 1)
+        self.run_query("SELECT 1 FROM b WHERE x = %s")
+        self.assertEqual(self.raw.prepares.count("SELECT 1 FROM b WHERE x = %s"), 2)
+        self.assertEqual(self.raw.prepares.count("SELECT 1 FROM a WHERE x = %s"), 1)
+
+    def test_failed_statement_is_not_cached(self):
+        with self.assertRaises(Error):
+            self.run_query("SELECT broken FROM users WHERE id = %s")
+        self.assertEqual(self.pool.stats()['statement_evictions'], 0)
+        self.assertTrue(self.raw.cursors[-1].closed)
+        with self.assertRaises(Error):
+            self.run_query("SELECT broken FROM users WHERE id = %s")
+        self.assertEqual(self.pool.stats()['statement_hits'], 0)
+
+    def test_unpreparable_query_falls_back_without_evicting(self):
+        good = ["SELECT 1 FROM a WHERE x = %s", "SELECT 1 FROM b WHERE x = %s"]
+        for query in good:
+            self.run_query(query)
+        self.raw.unpreparable.add("CALL refresh(%s)")
+        self.run_query("CALL refresh(%s)")
+        self.run_query("CALL refresh(%s)")
+        # Tried once, then sent straight to a plain cursor
+        self.assertEqual(self.raw.prepares.count("CALL refresh(%s)"), 1)
+        self.assertEqual([e[1] for e in self.raw.executed if e[0] == "CALL refresh(%s)"],
+                         [False, False])
+        for query in good:
+            self.run_query(query)
+        self.assertEqual(self.pool.stats()['statement_evictions'], 0)
+        self.assertEqual(self.raw.prepares.count(good[0]), 1)
+
+    def test_unpreparable_set_is_bounded(self):
+        statements = self.pool.statements_for(self.raw)
+        for i in range(5):
+            query = f"CALL refresh_{i}(%s)"
+            self.raw.unpreparable.add(query)
+            self.run_query(query)
+        self.assertEqual(len(statements._unpreparable), self.capacity)
+
+
+class TestStatementCursor(StatementCacheTestCase):
+    """Tests that StatementCursor stands in for an ordinary cursor."""
+    def test_extra_execute_arguments_use_plain_cursor(self):
+        cursor = self.connection.statement_cursor()
+        cursor.execute("SELECT 1", None, multi=False)
+        self.assertEqual(self.raw.executed[-1], ("SELECT 1", False, (), {'multi': False}))
+        self.assertEqual(self.raw.prepares, [])
+
+    def test_dict_params_use_plain_cursor(self):
+        cursor = self.connection.statement_cursor()
+        cursor.execute("SELECT %(x)s", {'x': 1})
+        self.assertFalse(self.raw.executed[-1][1])
+
+    def test_attributes_and_callproc_before_execute(self):
+        cursor = self.connection.statement_cursor()
+        self.assertEqual(cursor.column_names, ())
+        self.assertEqual(cursor.callproc('refresh', (1,)), (1,))
+        self.assertEqual(self.raw.executed[-1], ('refresh', False, (1,), {}))
+
+    def test_cache_disabled_returns_plain_cursor(self):
+        self.pool.statement_cache_size = 0
+        cursor = self.connection.statement_cursor()
+        self.assertIsInstance(cursor, FakeCursor)
+        self.assertFalse(cursor.prepared)
+
+
+if __name__ == "__main__":
+    unittest.main()